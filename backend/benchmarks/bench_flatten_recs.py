@@ -0,0 +1,136 @@
+"""Benchmark: flattening ALS top-k lists, notebook iterrows + CSV vs columnar parts.
+
+Builds a synthetic recommendForAllUsers result (one row per user holding
+k (movieId, rating) Rows) plus a movie metadata table, then runs each
+pipeline in a fresh spawned process so peak RSS is measured per pipeline:
+
+  legacy    the notebook: iterrows() + dict per recommendation, merge the
+            full metadata onto every row, one CSV
+  columnar  tools.als_output: chained-iterator flatten into int32/float32
+            columns, written as .npz parts (metadata kept separate)
+
+Reports wall time, peak RSS, RSS growth over the loaded input, and output
+size, and checks both pipelines produce the same triples.
+
+Run from backend/:
+    python -m benchmarks.bench_flatten_recs [--users 20000 200000] [--k 10]
+"""
+import argparse
+import multiprocessing as mp
+import resource
+import shutil
+import tempfile
+import time
+from pathlib import Path
+
+import numpy as np
+import pandas as pd
+
+from tools.als_output import flatten_recommendations, iter_parts, write_parts
+
+N_MOVIES = 20_000
+
+
+class Row(tuple):
+    """Stand-in for pyspark.sql.Row: a tuple that also indexes by field name."""
+    _fields = ("movieId", "rating")
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            key = self._fields.index(key)
+        return tuple.__getitem__(self, key)
+
+
+def make_input(users: int, k: int, seed: int = 7):
+    rng = np.random.default_rng(seed)
+    movie_ids = rng.integers(1, N_MOVIES, size=(users, k)).tolist()
+    ratings = rng.uniform(0, 5, size=(users, k)).tolist()
+    user_recs_pd = pd.DataFrame({
+        "userId": np.arange(1, users + 1),
+        "recommendations": [[Row(p) for p in zip(m, r)] for m, r in zip(movie_ids, ratings)],
+    })
+    movies_df = pd.DataFrame({
+        "movieId": np.arange(1, N_MOVIES),
+        "title": [f"Movie {i}" for i in range(1, N_MOVIES)],
+        "genres": "Action|Adventure|Sci-Fi",
+        "overview": "A long synopsis of the movie that gets copied onto every recommendation row. " * 3,
+        "poster_url": "https://image.tmdb.org/t/p/w500/poster.jpg",
+        "trailer_url": "https://www.youtube.com/watch?v=abcdefghijk",
+    })
+    return user_recs_pd, movies_df
+
+
+def legacy(user_recs_pd, movies_df, out: Path):
+    flattened_recs = []
+    for _, row in user_recs_pd.iterrows():
+        user_id = row['userId']
+        for rec in row['recommendations']:
+            flattened_recs.append({
+                'userId': user_id,
+                'movieId': rec['movieId'],
+                'predicted_rating': rec['rating']
+            })
+    als_flat_df = pd.DataFrame(flattened_recs)
+    hybrid_df = als_flat_df.merge(movies_df, on="movieId", how="left")
+    hybrid_df.to_csv(out / "hybrid_recommendations.csv", index=False)
+
+
+def columnar(user_recs_pd, movies_df, out: Path):
+    columns = flatten_recommendations(user_recs_pd["userId"].to_numpy(),
+                                      user_recs_pd["recommendations"].tolist())
+    write_parts(out / "als_topk", columns)
+    movies_df.to_csv(out / "movies.csv", index=False)
+
+
+def _current_rss_mb() -> float:
+    with open("/proc/self/statm") as f:
+        return int(f.read().split()[1]) * resource.getpagesize() / 2**20
+
+
+def _run(name, users, k, out, queue):
+    user_recs_pd, movies_df = make_input(users, k)
+    baseline = _current_rss_mb()
+    started = time.perf_counter()
+    {"legacy": legacy, "columnar": columnar}[name](user_recs_pd, movies_df, out)
+    elapsed = time.perf_counter() - started
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024  # KB on Linux
+    size = sum(p.stat().st_size for p in out.rglob("*") if p.is_file()) / 2**20
+    queue.put((elapsed, peak, peak - baseline, size))
+
+
+def _triples_match(out: Path) -> bool:
+    csv = pd.read_csv(out / "legacy" / "hybrid_recommendations.csv",
+                      usecols=["userId", "movieId", "predicted_rating"])
+    parts = pd.concat(pd.DataFrame(p) for p in iter_parts(out / "columnar" / "als_topk"))
+    return (np.array_equal(csv["userId"], parts["userId"])
+            and np.array_equal(csv["movieId"], parts["movieId"])
+            and np.allclose(csv["predicted_rating"], parts["predicted_rating"], atol=1e-5))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark flattening ALS recommendations")
+    parser.add_argument("--users", type=int, nargs="+", default=[20000, 200000])
+    parser.add_argument("--k", type=int, default=10)
+    args = parser.parse_args()
+
+    ctx = mp.get_context("spawn")
+    print(f"{'users':>8} {'pipeline':>9} {'wall s':>8} {'peak MB':>8} {'+RSS MB':>8} {'out MB':>8}")
+    for users in args.users:
+        root = Path(tempfile.mkdtemp(prefix="bench_flatten_"))
+        try:
+            for name in ("legacy", "columnar"):
+                out = root / name
+                out.mkdir()
+                queue = ctx.Queue()
+                proc = ctx.Process(target=_run, args=(name, users, args.k, out, queue))
+                proc.start()
+                elapsed, peak, grown, size = queue.get()
+                proc.join()
+                print(f"{users:>8} {name:>9} {elapsed:>8.2f} {peak:>8.0f} {grown:>8.0f} {size:>8.1f}")
+            print(f"{'':>8} same triples: {_triples_match(root)}")
+        finally:
+            shutil.rmtree(root, ignore_errors=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,139 @@
+"""Microbenchmark: per-title dedupe, per-row loop vs catalog columns.
+
+Generates synthetic hybridRecommendation2-shaped rows (several prediction
+rows per title, some without poster/trailer, a few NaN ratings) and times
+these implementations on the same input:
+
+  loop      the original per-row Python loop (kept here as the oracle)
+  served    _process_and_filter_movies, the loop the routes run on the
+            lists they fetch (a few thousand rows at most)
+  columns   building CatalogColumns over the rows, once per snapshot
+  dedupe    CatalogColumns.dedupe over all rows, which is what the
+            recommender's title pool runs on the shared columns
+
+All of them must pick the same rows. Copying the fields out of the dicts
+is what makes arrays lose on request-sized lists; dedupe only wins
+because the columns are already built for the snapshot.
+
+Run from backend/:
+    python -m benchmarks.bench_process_movies [--sizes 60 1000 10000 100000] [--repeat 5]
+"""
+import argparse
+import random
+import time
+from typing import Dict, List
+
+from bson import ObjectId
+
+import numpy as np
+
+from server.catalog_columns import CatalogColumns
+from server.routes.movieRoute import _process_and_filter_movies
+
+
+def reference_process_and_filter_movies(movie_list: List[Dict]) -> List[Dict]:
+    """The original pure-Python implementation, kept as the correctness oracle."""
+    if not movie_list:
+        return []
+    url_filtered_movies = [
+        movie for movie in movie_list
+        if movie.get("poster_url") and movie.get("trailer_url")
+    ]
+    deduplicated_movies: Dict[str, Dict] = {}
+    for movie in url_filtered_movies:
+        title = movie.get("title")
+        if not title:
+            continue
+        try:
+            current_rating = float(movie.get("predicted_rating", 0.0))
+        except (ValueError, TypeError):
+            current_rating = 0.0
+        if title not in deduplicated_movies or current_rating > float(deduplicated_movies[title].get("predicted_rating", 0.0)):
+            movie["predicted_rating"] = current_rating
+            deduplicated_movies[title] = movie
+    unique_movies = list(deduplicated_movies.values())
+    for movie in unique_movies:
+        if isinstance(movie.get("_id"), ObjectId):
+            movie["_id"] = str(movie["_id"])
+    return unique_movies
+
+
+def make_rows(n: int, seed: int = 7, messy: bool = False) -> List[Dict]:
+    rnd = random.Random(seed)
+    n_titles = max(n // 5, 1)
+    rows = []
+    for _ in range(n):
+        t = rnd.randrange(n_titles)
+        r = rnd.random()
+        rating = rnd.uniform(0, 5)
+        if r < 0.02:
+            rating = float("nan")  # pandas export of a missing prediction
+        elif messy and r < 0.04:
+            rating = None
+        elif messy and r < 0.06:
+            rating = f"{rating:.3f}"
+        rows.append({
+            "_id": ObjectId(),
+            "movieId": str(t),
+            "title": f"Movie {t}" if rnd.random() > 0.01 else "",
+            "poster_url": "https://image.tmdb.org/p.jpg" if rnd.random() > 0.1 else "",
+            "trailer_url": "https://youtube.com/watch?v=abcdefghijk" if rnd.random() > 0.05 else None,
+            "predicted_rating": rating,
+        })
+    return rows
+
+
+def _same(a: List[Dict], b: List[Dict]) -> bool:
+    if len(a) != len(b):
+        return False
+    for x, y in zip(a, b):
+        if x["_id"] != y["_id"]:
+            return False
+        rx, ry = x["predicted_rating"], y["predicted_rating"]
+        if not (rx == ry or (rx != rx and ry != ry)):
+            return False
+    return True
+
+
+def _same_rows(expected: List[Dict], rows: List[Dict], positions: np.ndarray) -> bool:
+    return [m["_id"] for m in expected] == [str(rows[i]["_id"]) for i in positions.tolist()]
+
+
+def _time(fn, rows, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        data = [dict(r) for r in rows]
+        started = time.perf_counter()
+        fn(data)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark _process_and_filter_movies")
+    parser.add_argument("--sizes", type=int, nargs="+", default=[60, 1000, 10000, 100000])
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--messy", action="store_true",
+                        help="also store some ratings as None / strings (forces the slow parse path)")
+    args = parser.parse_args()
+
+    print(f"{'rows':>8} {'loop ms':>10} {'served ms':>10} {'columns ms':>11} {'dedupe ms':>10} {'dedupe':>8}  same")
+    for n in args.sizes:
+        rows = make_rows(n, messy=args.messy)
+        expected = reference_process_and_filter_movies([dict(r) for r in rows])
+        columns = CatalogColumns(rows)
+        everything = np.arange(n)
+
+        same = (_same(expected, _process_and_filter_movies([dict(r) for r in rows]))
+                and _same_rows(expected, rows, columns.dedupe(everything)))
+
+        loop = _time(reference_process_and_filter_movies, rows, args.repeat)
+        served = _time(_process_and_filter_movies, rows, args.repeat)
+        build = _time(CatalogColumns, rows, args.repeat)
+        dedupe = _time(lambda _: columns.dedupe(everything), rows, args.repeat)
+        print(f"{n:>8} {loop * 1000:>10.2f} {served * 1000:>10.2f} {build * 1000:>11.2f} {dedupe * 1000:>10.2f}"
+              f" {loop / dedupe:>7.2f}x  {same}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,329 @@
+"""Offline evaluation: ranking quality and speed of each recommender strategy.
+
+Splits a MovieLens-style ratings.csv (userId, movieId, rating[, timestamp])
+into train and test, builds a catalog snapshot from the movie metadata csv
+and runs every strategy for each test user:
+
+  genre-sample  the old /regenerate: uniform sample of the user's genre pool
+  genre-matrix  the old als-* fallback: most shared genres with the liked movies
+  popular       most-rated titles in train (baseline)
+  als           server.als_engine.AlsEngine on factors trained on the train split
+  hybrid        server.hybrid_scorer, one user per call (the online endpoints)
+  hybrid-batch  the same scorer, --batch-size users per call (the precompute)
+
+Splits:
+  time         global timestamp cutoff; the newest --test-fraction of ratings is test
+  leave-k-out  each user's --holdout most recent ratings (random if no timestamp)
+
+A test rating of at least --relevant counts as a hit. Train ratings above
+the same threshold are the user's "liked" movies (the interactions the
+endpoints read). The user's genres, which /regenerate reads from
+users.streamer, are approximated by their --profile-genres most frequent
+liked genres. Everything rated in train is excluded from the lists.
+
+Reports precision@k, recall@k, NDCG@k, catalog coverage, users/sec and
+p50/p99 latency per user (per call divided by the users in it for
+hybrid-batch). Results are written as JSON to --out. With --baseline, the
+deltas against an earlier results file are printed as well.
+
+The movies csv needs movieId, title and genres. overview / director /
+actors / producers enable the content signal. Movies without poster_url /
+trailer_url columns are all treated as playable. Each movie's
+predicted_rating is its train mean rating, shrunk towards the global mean.
+
+Run from backend/:
+    python -m benchmarks.evaluate_recommenders ratings.csv --movies movies.csv
+        [--split time|leave-k-out] [--k 10] [--max-users 2000] [--strategies als hybrid ...]
+        [--out eval_results.json] [--baseline previous.json]
+"""
+import argparse
+import json
+import random
+import tempfile
+import time
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Dict, Iterable, List, NamedTuple, Optional, Sequence, Set
+
+import numpy as np
+import pandas as pd
+
+from server.als_engine import AlsEngine
+from server.catalog import CatalogSnapshot, clean_movie
+from server.content_index import NAME_FIELDS, ContentIndex, build_index, save_index
+from server.genres import normalize_genres
+from server.hybrid_scorer import HybridScorer, UserProfile
+from server.recommender import REGENERATE_SIZE, GenreMatrix, genre_pool, title_pool
+from tools.train_als import ratings_matrix, train
+
+STRATEGIES = ("genre-sample", "genre-matrix", "popular", "als", "hybrid", "hybrid-batch")
+METRICS = ("precision", "recall", "ndcg", "coverage", "users_per_sec", "latency_p50_ms", "latency_p99_ms")
+# prior weight (in ratings) of the global mean in each movie's predicted_rating
+RATING_PRIOR = 10
+
+
+class EvalUser(NamedTuple):
+    user_id: str
+    train: List[str]  # every movie rated in train, oldest first
+    liked: List[str]  # train movies rated >= --relevant
+    genres: List[str]
+    relevant: Set[str]  # test movies rated >= --relevant
+
+
+def split_ratings(df: pd.DataFrame, how: str, test_fraction: float, holdout: int, seed: int):
+    if how == "time":
+        if "timestamp" not in df:
+            raise SystemExit("❌ --split time needs a timestamp column in the ratings csv")
+        test = df["timestamp"] >= df["timestamp"].quantile(1 - test_fraction)
+    else:
+        order = df["timestamp"] if "timestamp" in df else pd.Series(
+            np.random.default_rng(seed).random(len(df)), index=df.index)
+        newest_first = order.groupby(df["userId"]).rank(method="first", ascending=False)
+        test = (newest_first <= holdout) & (df.groupby("userId")["userId"].transform("size") > holdout)
+    return df[~test], df[test]
+
+
+def build_catalog(movies: pd.DataFrame, train_df: pd.DataFrame) -> CatalogSnapshot:
+    stats = train_df.groupby("movieId")["rating"].agg(["sum", "count"])
+    prior = float(train_df["rating"].mean()) if len(train_df) else 0.0
+    predicted = (stats["sum"] + RATING_PRIOR * prior) / (stats["count"] + RATING_PRIOR)
+
+    movies = movies.astype(object).where(movies.notna(), None)
+    rows = []
+    for movie in movies.to_dict("records"):
+        movie_id = str(movie["movieId"])
+        rating = predicted.get(movie["movieId"])
+        rows.append(clean_movie({
+            **movie,
+            "_id": movie_id,
+            "movieId": movie_id,
+            "poster_url": movie.get("poster_url", "-"),
+            "trailer_url": movie.get("trailer_url", "-"),
+            "predicted_rating": None if rating is None else float(rating),
+        }))
+    return CatalogSnapshot(("eval", 0), rows)
+
+
+def build_content_index(snapshot: CatalogSnapshot, out: Path) -> Optional[ContentIndex]:
+    fields = ("overview", *NAME_FIELDS)
+    if not any(movie.get(f) for movie in snapshot.movies for f in fields):
+        return None
+    first = {}
+    for movie in snapshot.movies:
+        first.setdefault(movie["movieId"], movie)
+    save_index(out, build_index(list(first.values())))
+    return ContentIndex(out)
+
+
+def eval_users(train_df: pd.DataFrame, test_df: pd.DataFrame, snapshot: CatalogSnapshot,
+               relevant: float, profile_genres: int) -> List[EvalUser]:
+    if "timestamp" in train_df:
+        train_df = train_df.sort_values("timestamp", kind="stable")
+    hits = test_df[test_df["rating"] >= relevant].groupby("userId")["movieId"].agg(lambda s: set(map(str, s)))
+    users = []
+    for user_id, group in train_df[train_df["userId"].isin(hits.index)].groupby("userId", sort=True):
+        train_ids = group["movieId"].astype(str).tolist()
+        liked = group.loc[group["rating"] >= relevant, "movieId"].astype(str).tolist()
+        counts = Counter(g for m in map(snapshot.movie, liked) if m for g in normalize_genres(m.get("genres")))
+        users.append(EvalUser(str(user_id), train_ids, liked,
+                              [g for g, _ in counts.most_common(profile_genres)], hits[user_id]))
+    return users
+
+
+def sample_genre_positions(
+    snapshot: CatalogSnapshot,
+    genres: Iterable[str],
+    exclude_titles: Iterable[str] = (),
+    k: int = REGENERATE_SIZE,
+    rng: Optional[random.Random] = None,
+) -> List[int]:
+    """Up to `k` catalog positions of distinct titles drawn uniformly from the user's genre pool.
+
+    This is how /regenerate picked its list before the hybrid scorer, kept
+    here as the genre-sample baseline.
+
+    The pool (best row per matching title) is cached per catalog snapshot
+    and genre set, so a call only draws k + len(exclude_titles) positions:
+    enough that every excluded title could be hit and k still remain.
+    """
+    rng = rng or random
+    pool = genre_pool(snapshot, genres)
+    excluded = set(exclude_titles)
+    draw = min(len(pool), k + len(excluded))
+    if not draw:
+        return []
+
+    picks: List[int] = []
+    for slot in rng.sample(range(len(pool)), draw):
+        pos = int(pool[slot])
+        if excluded and snapshot.movies[pos].get("title") in excluded:
+            continue
+        picks.append(pos)
+        if len(picks) >= k:
+            break
+    return picks
+
+
+def make_strategies(snapshot: CatalogSnapshot, train_df: pd.DataFrame, args,
+                    content: Optional[ContentIndex]) -> Dict[str, Callable[[Sequence[EvalUser]], List[List[str]]]]:
+    ids = [m["movieId"] for m in snapshot.movies]
+    k = args.k
+    wanted = set(args.strategies)
+    strategies = {}
+
+    def movie_ids(positions):
+        return [ids[p] for p in positions]
+
+    def genre_sample(users):
+        out = []
+        for u in users:
+            titles = [(snapshot.movie(m) or {}).get("title") for m in u.train]
+            rng = random.Random(f"{args.seed}:{u.user_id}")
+            out.append(movie_ids(sample_genre_positions(snapshot, u.genres, titles, k, rng)) if u.genres else [])
+        return out
+    strategies["genre-sample"] = genre_sample
+
+    def genre_matrix(users):
+        matrix = GenreMatrix.for_snapshot(snapshot)
+        out = []
+        for u in users:
+            genres = {g for m in map(snapshot.movie, u.liked) if m for g in normalize_genres(m.get("genres"))}
+            out.append(movie_ids(matrix.top(genres, u.train, k)))
+        return out
+    strategies["genre-matrix"] = genre_matrix
+
+    ranked_popular = train_df["movieId"].astype(str).value_counts().index.tolist()
+
+    def popular(users):
+        out = []
+        for u in users:
+            seen = set(u.train)
+            out.append([m for m in ranked_popular[:k + len(seen)] if m not in seen][:k])
+        return out
+    strategies["popular"] = popular
+
+    engine = None
+    if wanted & {"als", "hybrid", "hybrid-batch"}:
+        started = time.perf_counter()
+        matrix, user_ids, item_ids = ratings_matrix(train_df)
+        users_f, items_f = train(matrix, args.rank, args.iterations, args.reg, args.implicit,
+                                 threads=args.threads, seed=args.seed, verbose=False)
+        engine = AlsEngine(users_f, items_f, user_ids.astype(str), item_ids.astype(str))
+        print(f"🧮 ALS rank {args.rank} trained on {matrix.nnz} ratings in {time.perf_counter() - started:.1f}s")
+
+        def als(users):
+            return [[m for m, _ in engine.recommend(u.user_id, u.train, (), k)] for u in users]
+        strategies["als"] = als
+
+        scorer = HybridScorer(snapshot, engine, content)
+
+        def hybrid(users):
+            profiles = [UserProfile(u.user_id, u.genres, u.liked, u.train) for u in users]
+            return [movie_ids(p) for p in scorer.top(profiles, k)]
+        strategies["hybrid"] = strategies["hybrid-batch"] = hybrid
+
+    return {name: fn for name, fn in strategies.items() if name in wanted}
+
+
+def score_lists(users: Sequence[EvalUser], lists: Sequence[List[str]], k: int) -> Dict[str, float]:
+    discounts = 1.0 / np.log2(np.arange(2, k + 2))
+    precision, recall, ndcg = [], [], []
+    for u, recs in zip(users, lists):
+        gains = np.array([m in u.relevant for m in recs[:k]], dtype=np.float64)
+        hits = gains.sum()
+        precision.append(hits / k)
+        recall.append(hits / len(u.relevant))
+        ideal = discounts[:min(len(u.relevant), k)].sum()
+        ndcg.append(float(gains @ discounts[:len(gains)]) / ideal)
+    return {"precision": float(np.mean(precision)), "recall": float(np.mean(recall)), "ndcg": float(np.mean(ndcg))}
+
+
+def run(name: str, fn, users: Sequence[EvalUser], batch_size: int, k: int, catalog_size: int) -> Dict[str, float]:
+    step = batch_size if name == "hybrid-batch" else 1
+    lists, latencies = [], []
+    started = time.perf_counter()
+    for start in range(0, len(users), step):
+        batch = users[start:start + step]
+        call = time.perf_counter()
+        lists.extend(fn(batch))
+        latencies.extend([(time.perf_counter() - call) / len(batch)] * len(batch))
+    elapsed = time.perf_counter() - started
+
+    result = score_lists(users, lists, k)
+    result["coverage"] = len({m for recs in lists for m in recs}) / catalog_size if catalog_size else 0.0
+    result["users_per_sec"] = len(users) / elapsed if elapsed else 0.0
+    result["latency_p50_ms"] = float(np.percentile(latencies, 50) * 1000) if latencies else 0.0
+    result["latency_p99_ms"] = float(np.percentile(latencies, 99) * 1000) if latencies else 0.0
+    result["users"] = len(users)
+    result["users_per_call"] = step
+    return result
+
+
+def print_table(results: Dict[str, Dict], k: int, baseline: Optional[Dict] = None) -> None:
+    header = f"{'strategy':<13} {f'P@{k}':>8} {f'R@{k}':>8} {f'NDCG@{k}':>8} {'cover':>7} {'users/s':>9} {'p50 ms':>8} {'p99 ms':>8}"
+    print(header)
+    for name, r in results.items():
+        print(f"{name:<13} {r['precision']:>8.4f} {r['recall']:>8.4f} {r['ndcg']:>8.4f} {r['coverage']:>7.3f} "
+              f"{r['users_per_sec']:>9.0f} {r['latency_p50_ms']:>8.2f} {r['latency_p99_ms']:>8.2f}")
+        old = (baseline or {}).get(name)
+        if old:
+            deltas = " ".join(f"{metric} {r[metric] - old.get(metric, 0.0):+.4g}" for metric in METRICS)
+            print(f"{'':<13} vs baseline: {deltas}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("ratings", type=Path, help="ratings.csv with userId, movieId, rating[, timestamp]")
+    parser.add_argument("--movies", type=Path, required=True, help="movie metadata csv (movieId, title, genres, ...)")
+    parser.add_argument("--split", choices=("time", "leave-k-out"), default="leave-k-out")
+    parser.add_argument("--test-fraction", type=float, default=0.2, help="time split: share of ratings held out")
+    parser.add_argument("--holdout", type=int, default=5, help="leave-k-out: ratings held out per user")
+    parser.add_argument("--relevant", type=float, default=4.0, help="minimum rating that counts as a hit / like")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--strategies", nargs="+", choices=STRATEGIES, default=list(STRATEGIES))
+    parser.add_argument("--max-users", type=int, default=2000, help="evaluate a random sample of test users (0: all)")
+    parser.add_argument("--batch-size", type=int, default=256, help="users per call for hybrid-batch")
+    parser.add_argument("--profile-genres", type=int, default=3)
+    parser.add_argument("--rank", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--reg", type=float, default=0.1)
+    parser.add_argument("--implicit", action="store_true")
+    parser.add_argument("--threads", type=int, default=4)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--out", type=Path, default=Path("eval_results.json"))
+    parser.add_argument("--baseline", type=Path, help="earlier results file to print deltas against")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    ratings = pd.read_csv(args.ratings)
+    train_df, test_df = split_ratings(ratings, args.split, args.test_fraction, args.holdout, args.seed)
+    snapshot = build_catalog(pd.read_csv(args.movies), train_df)
+    catalog_size = len(title_pool(snapshot))
+    users = eval_users(train_df, test_df, snapshot, args.relevant, args.profile_genres)
+    if args.max_users and len(users) > args.max_users:
+        users = random.Random(args.seed).sample(users, args.max_users)
+    print(f"📥 {len(train_df)} train / {len(test_df)} test ratings ({args.split}), {catalog_size} titles, "
+          f"{len(users)} users evaluated, in {time.perf_counter() - started:.1f}s")
+
+    with tempfile.TemporaryDirectory(prefix="eval_content_") as content_dir:
+        content = build_content_index(snapshot, Path(content_dir)) if {"hybrid", "hybrid-batch"} & set(args.strategies) else None
+        strategies = make_strategies(snapshot, train_df, args, content)
+        results = {}
+        for name in args.strategies:
+            results[name] = run(name, strategies[name], users, args.batch_size, args.k, catalog_size)
+            print(f"✅ {name}: NDCG@{args.k} {results[name]['ndcg']:.4f}, {results[name]['users_per_sec']:.0f} users/s")
+
+    baseline = json.loads(args.baseline.read_text())["results"] if args.baseline else None
+    print_table(results, args.k, baseline)
+    args.out.write_text(json.dumps({
+        "createdAt": datetime.utcnow().isoformat(),
+        "config": {key: str(value) if isinstance(value, Path) else value for key, value in vars(args).items()},
+        "dataset": {"train": len(train_df), "test": len(test_df), "titles": catalog_size, "users": len(users)},
+        "results": results,
+    }, indent=2))
+    print(f"💾 Results written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
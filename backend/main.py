@@ -110,6 +110,7 @@
 #     return feedback_items
 
 
+from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from pymongo import MongoClient
@@ -118,6 +119,13 @@ from pathlib import Path
 import os
 import socket
 
+from server.catalog import CatalogStore
+from server.als_engine import AlsEngine
+from server.neighbors import NeighborIndex
+from server.content_index import ContentIndex
+from server.result_cache import ResultCache
+from server.history_buffer import HistoryBuffer, HISTORY_FLUSH_WINDOW
+
 from server.routes.auth import router as auth_router
 from server.routes.genreRoute import router as genre_router
 from server.routes.movieRoute import router as movie_router
@@ -186,8 +194,19 @@ support_client = MongoClient(SUPPORT_DB_URI)
 support_db = support_client["support"]
 print("✅ Connected to support. Collections:", support_db.list_collection_names())
 
+# Load the in-process catalog snapshot before serving requests
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    app.state.catalog.load()
+    if app.state.history_buffer is not None:
+        app.state.history_buffer.start()
+    yield
+    # write buffered history views before the process exits
+    if app.state.history_buffer is not None:
+        app.state.history_buffer.close()
+
 # Initialize FastAPI app
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # CORS
 origins = [
@@ -208,6 +227,12 @@ app.add_middleware(
 app.state.user_db = user_db
 app.state.movie_db = movie_db
 app.state.support_db = support_db
+app.state.catalog = CatalogStore(movie_db)
+app.state.als = AlsEngine.load_if_present()
+app.state.neighbors = NeighborIndex.load_if_present()
+app.state.content_index = ContentIndex.load_if_present()
+app.state.result_cache = ResultCache()
+app.state.history_buffer = HistoryBuffer(movie_db["history"]) if HISTORY_FLUSH_WINDOW > 0 else None
 
 # Routes
 app.include_router(auth_router, prefix="/api/auth")
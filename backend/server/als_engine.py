@@ -0,0 +1,109 @@
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from fastapi import Request
+
+ALS_MODEL_DIR = Path(os.getenv("ALS_MODEL_DIR", Path(__file__).resolve().parent.parent / "models" / "als"))
+MODEL_FILES = ("user_factors.npy", "item_factors.npy", "user_ids.npy", "item_ids.npy")
+
+
+class AlsEngine:
+    """Serves ALS recommendations from factor matrices on disk.
+
+    The model directory holds four .npy files: user_factors (users x f),
+    item_factors (items x f) and the user/movie ids for their rows. The
+    factor matrices are memory-mapped, so the process only pays for the
+    pages it touches and several workers share them through the page cache.
+
+    Scoring a user is one matrix-vector product over all items followed by
+    an argpartition for the top k; ids the user has interacted with (or the
+    caller excludes) are masked to -inf before selection. Users the model
+    was not trained on are folded in from the items they interacted with.
+    """
+
+    def __init__(self, user_factors: np.ndarray, item_factors: np.ndarray,
+                 user_ids: np.ndarray, item_ids: np.ndarray, regularization: float = 0.1):
+        if user_factors.shape[0] != len(user_ids) or item_factors.shape[0] != len(item_ids):
+            raise ValueError("ALS factor matrices and id arrays have different lengths")
+        if user_factors.shape[1] != item_factors.shape[1]:
+            raise ValueError("ALS user and item factors have different ranks")
+        self.user_factors = user_factors
+        self.item_factors = item_factors
+        self.item_ids = [str(i) for i in item_ids.tolist()]
+        self.user_row: Dict[str, int] = {str(u): i for i, u in enumerate(user_ids.tolist())}
+        self.item_row: Dict[str, int] = {m: i for i, m in enumerate(self.item_ids)}
+        self.regularization = regularization
+
+    @classmethod
+    def load(cls, model_dir: Path = ALS_MODEL_DIR) -> "AlsEngine":
+        model_dir = Path(model_dir)
+        return cls(
+            np.load(model_dir / "user_factors.npy", mmap_mode="r"),
+            np.load(model_dir / "item_factors.npy", mmap_mode="r"),
+            np.load(model_dir / "user_ids.npy", allow_pickle=False),
+            np.load(model_dir / "item_ids.npy", allow_pickle=False),
+        )
+
+    @classmethod
+    def load_if_present(cls, model_dir: Path = ALS_MODEL_DIR) -> Optional["AlsEngine"]:
+        """The engine, or None (with a warning) when no model has been trained yet."""
+        model_dir = Path(model_dir)
+        if not all((model_dir / name).exists() for name in MODEL_FILES):
+            print(f"⚠️ No ALS model in {model_dir}; ALS endpoints will use the genre fallback.")
+            return None
+        try:
+            engine = cls.load(model_dir)
+        except Exception as e:
+            print(f"❌ Failed to load ALS model from {model_dir}: {e}")
+            return None
+        print(f"🧮 ALS model loaded: {len(engine.user_row)} users x {len(engine.item_ids)} items, "
+              f"rank {engine.item_factors.shape[1]}")
+        return engine
+
+    def item_rows(self, movie_ids: Iterable[str]) -> np.ndarray:
+        rows = [self.item_row[m] for m in map(str, movie_ids) if m in self.item_row]
+        return np.asarray(rows, dtype=np.int64)
+
+    def user_vector(self, user_id: str, interacted_ids: Iterable[str] = ()) -> Optional[np.ndarray]:
+        """The user's factor row, or a fold-in from the items they interacted with."""
+        row = self.user_row.get(str(user_id))
+        if row is not None:
+            return np.asarray(self.user_factors[row])
+        items = self.item_rows(interacted_ids)
+        if not len(items):
+            return None
+        # One ALS half-step with the item factors fixed: (Y'Y + λI) x = Y'1
+        Y = np.asarray(self.item_factors[items], dtype=np.float64)
+        gram = Y.T @ Y + self.regularization * len(items) * np.eye(Y.shape[1])
+        return np.linalg.solve(gram, Y.sum(axis=0)).astype(self.item_factors.dtype)
+
+    def recommend(self, user_id: str, interacted_ids: Iterable[str] = (),
+                  exclude_ids: Iterable[str] = (), k: int = 50) -> List[Tuple[str, float]]:
+        """Top-k (movieId, score) for a user, best first, never returning interacted/excluded ids.
+
+        ALS alone: the endpoints blend it with the other signals through
+        server.hybrid_scorer, and benchmarks.evaluate_recommenders uses this
+        as its ALS-only baseline.
+        """
+        interacted_ids = list(map(str, interacted_ids))
+        vector = self.user_vector(user_id, interacted_ids)
+        if vector is None:
+            return []
+
+        scores = np.asarray(self.item_factors @ vector)
+        masked = self.item_rows([*interacted_ids, *map(str, exclude_ids)])
+        if len(masked):
+            scores[masked] = -np.inf
+
+        k = min(k, len(scores) - len(np.unique(masked)))
+        if k <= 0:
+            return []
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top], kind="stable")]
+        return [(self.item_ids[i], float(scores[i])) for i in top.tolist()]
+
+
+def get_als_engine(request: Request) -> Optional[AlsEngine]:
+    return getattr(request.app.state, "als", None)
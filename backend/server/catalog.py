@@ -0,0 +1,244 @@
+import math
+import os
+import threading
+import time
+from collections import OrderedDict
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+from fastapi import Request
+from pymongo import ReturnDocument
+
+CATALOG_COLLECTION = "hybridRecommendation2"
+SYNC_INFO_ID = "latest_sync_info"
+
+# Normalised layout written by tools.split_catalog: one `movies` document per
+# movieId, carrying its best predicted_rating and its prediction_count.
+MOVIES_COLLECTION = "movies"
+SPLIT_LAYOUT = "split"
+
+# seconds between checks of sync_metadata for catalog changes made by other processes
+CATALOG_CHECK_INTERVAL = float(os.getenv("CATALOG_CHECK_INTERVAL", "5"))
+
+
+def clean_movie(doc: Dict[str, Any]) -> Dict[str, Any]:
+    """Make a raw catalog document JSON-safe (str _id, NaN -> None, ISO dates)."""
+    out = dict(doc)
+    if "_id" in out:
+        out["_id"] = str(out["_id"])
+    for key, value in out.items():
+        if isinstance(value, float) and math.isnan(value):
+            out[key] = None
+        elif isinstance(value, datetime):
+            out[key] = value.isoformat()
+    return out
+
+
+def _sync_info(db) -> Dict[str, Any]:
+    return db["sync_metadata"].find_one(
+        {"_id": SYNC_INFO_ID},
+        {"last_successful_sync_batch_id": 1, "catalog_revision": 1, "catalog_layout": 1},
+    ) or {}
+
+
+def _version(meta: Dict[str, Any]) -> Tuple[Optional[str], int]:
+    return meta.get("last_successful_sync_batch_id"), int(meta.get("catalog_revision") or 0)
+
+
+def _collection(meta: Dict[str, Any]) -> str:
+    return MOVIES_COLLECTION if meta.get("catalog_layout") == SPLIT_LAYOUT else CATALOG_COLLECTION
+
+
+def read_catalog_version(db) -> Tuple[Optional[str], int]:
+    """(latest sync batch id, catalog revision) as recorded in sync_metadata."""
+    return _version(_sync_info(db))
+
+
+def catalog_collection(db) -> str:
+    """Name of the collection holding catalog metadata in the layout this database uses."""
+    return _collection(_sync_info(db))
+
+
+def bump_catalog_revision(db) -> Tuple[Optional[str], int]:
+    """Record a catalog change that does not produce a new sync batch (e.g. a delete).
+
+    Returns the catalog version after the bump.
+    """
+    meta = db["sync_metadata"].find_one_and_update(
+        {"_id": SYNC_INFO_ID},
+        {"$inc": {"catalog_revision": 1}},
+        upsert=True,
+        return_document=ReturnDocument.AFTER,
+    )
+    return _version(meta or {})
+
+
+def _first_position_by_movie_id(snapshot: "CatalogSnapshot") -> Dict[str, int]:
+    positions: Dict[str, int] = {}
+    for i, m in enumerate(snapshot.movies):
+        movie_id = m.get("movieId")
+        if movie_id not in (None, ""):
+            positions.setdefault(str(movie_id), i)
+    return positions
+
+
+class CatalogSnapshot:
+    """Immutable, fully cleaned copy of the catalog at one version.
+
+    Rows are kept in `_id` order. Indexes built on top of the rows are
+    memoised per snapshot through `derived()`, so they are rebuilt exactly
+    once per catalog version and never go stale.
+    """
+
+    def __init__(self, version: Tuple[Optional[str], int], movies: List[Dict[str, Any]],
+                 collection: str = CATALOG_COLLECTION):
+        self.version = version
+        self.movies = movies
+        self.collection = collection
+        self.loaded_at = datetime.utcnow()
+        self._derived: Dict[str, Any] = {}
+        # re-entrant: a derived structure may be built on top of another one
+        self._lock = threading.RLock()
+
+    @property
+    def batch_id(self) -> Optional[str]:
+        return self.version[0]
+
+    def derived(self, name: str, build: Callable[["CatalogSnapshot"], Any]) -> Any:
+        value = self._derived.get(name)
+        if value is None:
+            with self._lock:
+                value = self._derived.get(name)
+                if value is None:
+                    value = build(self)
+                    self._derived[name] = value
+        return value
+
+    def memo(self, namespace: str, key: Any, build: Callable[[], Any], maxsize: int = 128) -> Any:
+        """Per-snapshot LRU for query-dependent results (e.g. the rows matching a search)."""
+        cache = self.derived(f"memo:{namespace}", lambda _: OrderedDict())
+        with self._lock:
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+        value = build()
+        with self._lock:
+            cache[key] = value
+            cache.move_to_end(key)
+            while len(cache) > maxsize:
+                cache.popitem(last=False)
+        return value
+
+    def position_of(self, movie_oid: str) -> Optional[int]:
+        """Row position of a document `_id` in this snapshot, if present."""
+        positions = self.derived(
+            "position_by_oid",
+            lambda snap: {m.get("_id"): i for i, m in enumerate(snap.movies)},
+        )
+        return positions.get(movie_oid)
+
+    def movie(self, movie_id: Any) -> Optional[Dict[str, Any]]:
+        """The catalog row for a movieId (its first row in the per-prediction layout)."""
+        pos = self.derived("position_by_movie_id", _first_position_by_movie_id).get(str(movie_id))
+        return None if pos is None else self.movies[pos]
+
+
+class CatalogStore:
+    """Holds the current CatalogSnapshot and reloads it in the background.
+
+    The snapshot is loaded once at startup and only reloaded when the
+    version in sync_metadata has actually moved: on `refresh_async()` from a
+    write endpoint, and at most every CATALOG_CHECK_INTERVAL seconds from
+    `current()` (so writes made by other worker processes are picked up).
+    Readers keep using the previous snapshot until the new one is swapped
+    in. Unless a collection is pinned, each load reads from whichever layout
+    sync_metadata says is live.
+    """
+
+    def __init__(self, db, collection: Optional[str] = None, batch_size: int = 2000,
+                 check_interval: float = CATALOG_CHECK_INTERVAL):
+        self.db = db
+        self.collection = collection
+        self.batch_size = batch_size
+        self.check_interval = check_interval
+        self._checked_at = time.monotonic()
+        self._snapshot: Optional[CatalogSnapshot] = None
+        self._load_lock = threading.Lock()
+        self._state_lock = threading.Lock()
+        self._reloading = False
+        self._dirty = False
+
+    def load(self, force: bool = False) -> CatalogSnapshot:
+        with self._load_lock:
+            meta = _sync_info(self.db)
+            version = _version(meta)
+            current = self._snapshot
+            if current is not None and not force and current.version == version:
+                return current
+
+            started = time.perf_counter()
+            collection = self.collection or _collection(meta)
+            cursor = self.db[collection].find({}).sort("_id", 1).batch_size(self.batch_size)
+            movies = [clean_movie(doc) for doc in cursor]
+            snapshot = CatalogSnapshot(version, movies, collection)
+            self._snapshot = snapshot
+            print(f"📦 Catalog snapshot loaded: {len(movies)} rows from {collection}, batch {version[0]} "
+                  f"rev {version[1]} in {time.perf_counter() - started:.2f}s")
+            return snapshot
+
+    def peek(self) -> Optional[CatalogSnapshot]:
+        """The loaded snapshot, or None if the first load has not finished yet."""
+        return self._snapshot
+
+    def current(self) -> CatalogSnapshot:
+        snapshot = self._snapshot
+        if snapshot is None:
+            return self.load()
+        if self.check_interval > 0 and time.monotonic() - self._checked_at >= self.check_interval:
+            self._checked_at = time.monotonic()
+            self.refresh_async()
+        return snapshot
+
+    def drop_row(self, movie_oid: Any, version: Tuple[Optional[str], int]) -> CatalogSnapshot:
+        """Swap in the current snapshot minus the document `movie_oid`, right after it was deleted.
+
+        `version` is what bump_catalog_revision returned for the delete. If
+        anything else changed the catalog in between, this reloads instead.
+        """
+        with self._load_lock:
+            current = self._snapshot
+            if current is not None and version == (current.version[0], current.version[1] + 1):
+                movies = [m for m in current.movies if m.get("_id") != str(movie_oid)]
+                self._snapshot = CatalogSnapshot(version, movies, current.collection)
+                return self._snapshot
+        return self.load()
+
+    def refresh_async(self) -> None:
+        """Schedule a background reload; concurrent calls coalesce into one extra pass."""
+        with self._state_lock:
+            if self._reloading:
+                self._dirty = True
+                return
+            self._reloading = True
+        threading.Thread(target=self._reload_loop, name="catalog-reload", daemon=True).start()
+
+    def _reload_loop(self) -> None:
+        while True:
+            try:
+                self.load()
+            except Exception as e:
+                print(f"❌ Catalog reload failed: {e}")
+            with self._state_lock:
+                if not self._dirty:
+                    self._reloading = False
+                    return
+                self._dirty = False
+
+
+def get_catalog(request: Request) -> CatalogSnapshot:
+    return request.app.state.catalog.current()
+
+
+def get_catalog_collection(request: Request):
+    """The live catalog collection, as used by the current snapshot."""
+    return request.app.state.movie_db[get_catalog(request).collection]
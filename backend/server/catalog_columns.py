@@ -0,0 +1,82 @@
+from typing import Any, Dict, List, Sequence
+
+import numpy as np
+
+from server.catalog import CatalogSnapshot
+
+
+def _as_rating(value: Any) -> float:
+    try:
+        return float(value)
+    except (ValueError, TypeError):
+        return 0.0
+
+
+def parse_ratings(values: list) -> np.ndarray:
+    """predicted_rating column as float64, with float()'s semantics (unparseable -> 0.0)."""
+    # Fast path: one C-level conversion. None is excluded because numpy maps it
+    # to NaN where float() raises (-> 0.0).
+    if None not in values:
+        try:
+            return np.array(values, dtype=np.float64)
+        except (ValueError, TypeError):
+            pass
+    return np.array([_as_rating(v) for v in values], dtype=np.float64)
+
+
+def title_argmax(codes: np.ndarray, ratings: np.ndarray) -> np.ndarray:
+    """Per title code, the row that a sequential "keep the first strictly higher rating" pass keeps.
+
+    Returns row indices ordered by each title's first occurrence. Within a
+    title the earliest row with the highest rating wins; NaN ratings never
+    win, except a NaN first row, which a `>` comparison can never displace.
+    """
+    n = len(codes)
+    if not n:
+        return np.empty(0, dtype=np.int64)
+    _, first, dense = np.unique(codes, return_index=True, return_inverse=True)
+    opens_group = np.zeros(n, dtype=bool)
+    opens_group[first] = True
+
+    nan = np.isnan(ratings)
+    key = np.where(nan, -np.inf, ratings)
+    key[opens_group & nan] = np.inf
+
+    best = np.full(len(first), -np.inf)
+    np.maximum.at(best, dense, key)
+    candidates = np.flatnonzero(key == best[dense])
+    winners = np.full(len(first), n, dtype=np.int64)
+    np.minimum.at(winners, dense[candidates], candidates)
+    return winners[np.argsort(first, kind="stable")]
+
+
+class CatalogColumns:
+    """Array-backed columns of a catalog snapshot for the recommendation hot paths.
+
+    `eligible` is the poster/trailer/title filter, `title_code` numbers
+    titles, `ratings` is the parsed predicted_rating. Deduplicating any
+    subset of rows is then pure array work on row positions.
+    """
+
+    def __init__(self, movies: List[Dict[str, Any]]):
+        n = len(movies)
+        self.eligible = np.fromiter(
+            (bool(m.get("poster_url")) and bool(m.get("trailer_url")) and bool(m.get("title")) for m in movies),
+            dtype=bool, count=n,
+        )
+        first_seen: Dict[Any, int] = {}
+        self.title_code = np.fromiter(
+            (first_seen.setdefault(m.get("title") or "", i) for i, m in enumerate(movies)),
+            dtype=np.int64, count=n,
+        )
+        self.ratings = parse_ratings([m.get("predicted_rating", 0.0) for m in movies])
+
+    @classmethod
+    def for_snapshot(cls, snapshot: CatalogSnapshot) -> "CatalogColumns":
+        return snapshot.derived("catalog_columns", lambda snap: cls(snap.movies))
+
+    def dedupe(self, positions: Sequence[int]) -> np.ndarray:
+        """Winning catalog positions among `positions` (taken in the given order)."""
+        positions = np.asarray(positions, dtype=np.int64)
+        positions = positions[self.eligible[positions]]
+        return positions[title_argmax(self.title_code[positions], self.ratings[positions])]
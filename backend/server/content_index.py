@@ -0,0 +1,295 @@
+import itertools
+import os
+import re
+import shutil
+import threading
+import time
+import zlib
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from fastapi import Request
+
+CONTENT_INDEX_DIR = Path(os.getenv("CONTENT_INDEX_DIR", Path(__file__).resolve().parent.parent / "models" / "content"))
+N_FEATURES = 1 << 18
+
+# field -> (token prefix, weight); names are kept whole, overviews split into words
+NAME_FIELDS = {"director": ("director:", 3.0), "actors": ("actor:", 2.0), "producers": ("producer:", 1.0)}
+OVERVIEW_WEIGHT = 1.0
+# query features whose posting list covers more than this share of the
+# catalog carry almost no idf weight and are skipped
+MAX_POSTING_FRACTION = 0.2
+# seconds between checks for delta segments written by other workers
+DELTA_CHECK_INTERVAL = float(os.getenv("CONTENT_DELTA_CHECK_INTERVAL", "5"))
+
+_WORD = re.compile(r"[a-z0-9]+")
+_NAME_SEPARATORS = re.compile(r"[,|]")
+STOP_WORDS = frozenset("""
+a an and are as at be by for from has he her his in is it its of on or she that the their they this
+to was were when where who will with after into out over about up his him while one two them
+""".split())
+
+
+def _hash(token: str) -> int:
+    return zlib.crc32(token.encode("utf-8")) & (N_FEATURES - 1)
+
+
+def term_counts(movie: Dict) -> Counter:
+    """Weighted hashed term counts from overview, director, actors and producers."""
+    counts: Counter = Counter()
+    overview = movie.get("overview")
+    if isinstance(overview, str):
+        for word in _WORD.findall(overview.lower()):
+            if len(word) > 2 and word not in STOP_WORDS:
+                counts[_hash(word)] += OVERVIEW_WEIGHT
+    for field, (prefix, weight) in NAME_FIELDS.items():
+        value = movie.get(field)
+        names = _NAME_SEPARATORS.split(value) if isinstance(value, str) else value if isinstance(value, list) else []
+        for name in names:
+            if isinstance(name, str) and name.strip():
+                counts[_hash(prefix + " ".join(name.lower().split()))] += weight
+    return counts
+
+
+def tfidf(counts: Counter, idf: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """(features, weights) of an L2-normalised tf-idf vector."""
+    if not counts:
+        return np.empty(0, dtype=np.int32), np.empty(0, dtype=np.float32)
+    features = np.fromiter(counts.keys(), dtype=np.int32, count=len(counts))
+    weights = np.fromiter(counts.values(), dtype=np.float64, count=len(counts)) * idf[features]
+    norm = np.linalg.norm(weights)
+    return features, (weights / norm if norm else weights).astype(np.float32)
+
+
+def build_index(movies: List[Dict]) -> Dict[str, np.ndarray]:
+    """Arrays of a content index over `movies` (one per movieId), as stored on disk.
+
+    Postings are feature-major (CSC): feature f's documents and weights are
+    `postings_docs/postings_weights[postings_indptr[f]:postings_indptr[f + 1]]`.
+    """
+    counts = [term_counts(m) for m in movies]
+    df = np.zeros(N_FEATURES, dtype=np.int64)
+    for c in counts:
+        df[list(c.keys())] += 1
+    idf = (np.log((1 + len(movies)) / (1 + df)) + 1.0).astype(np.float32)
+
+    vectors = [tfidf(c, idf) for c in counts]
+    docs = np.repeat(np.arange(len(movies), dtype=np.int32), [len(f) for f, _ in vectors])
+    features = np.concatenate([f for f, _ in vectors]) if vectors else np.empty(0, dtype=np.int32)
+    weights = np.concatenate([w for _, w in vectors]) if vectors else np.empty(0, dtype=np.float32)
+    order = np.argsort(features, kind="stable")
+    indptr = np.zeros(N_FEATURES + 1, dtype=np.int64)
+    np.cumsum(np.bincount(features, minlength=N_FEATURES), out=indptr[1:])
+    return {
+        "item_ids": np.array([str(m.get("movieId")) for m in movies], dtype=str),
+        "idf": idf,
+        "postings_indptr": indptr,
+        "postings_docs": docs[order],
+        "postings_weights": weights[order],
+    }
+
+
+def save_index(out: Path, arrays: Dict[str, np.ndarray]) -> None:
+    out.mkdir(parents=True, exist_ok=True)
+    for name, array in arrays.items():
+        np.save(out / f"{name}.npy", array)
+    shutil.rmtree(out / "delta", ignore_errors=True)
+
+
+class ContentIndex:
+    """Similar movies by overview / director / actors / producers (hashed tf-idf, cosine).
+
+    The base index is built offline by tools.build_content_index and
+    memory-mapped. A query only touches the posting lists of its own
+    features (skipping near-universal ones), so it never scans the catalog.
+    Movies synced in later are added to a small in-memory delta, scored
+    exactly, and persisted until the next full rebuild. Every upsert/remove
+    writes only its own changes as a new segment in delta/ (temp file +
+    os.replace, unique name per process), so a sync never rewrites the
+    whole delta and workers never overwrite each other. Each worker picks
+    up the others' segments at most every DELTA_CHECK_INTERVAL seconds.
+    """
+
+    def __init__(self, model_dir: Path, check_interval: float = DELTA_CHECK_INTERVAL):
+        self.model_dir = Path(model_dir)
+        self.idf = np.asarray(self._mmap("idf"))
+        self.indptr = self._mmap("postings_indptr")
+        self.docs = self._mmap("postings_docs")
+        self.weights = self._mmap("postings_weights")
+        self.item_ids = [str(i) for i in np.load(self.model_dir / "item_ids.npy").tolist()]
+        self.row: Dict[str, int] = {m: i for i, m in enumerate(self.item_ids)}
+        self.max_postings = max(1, int(len(self.item_ids) * MAX_POSTING_FRACTION))
+        self._lock = threading.Lock()
+        self.removed: set = set()
+        self.delta: Dict[str, Tuple[np.ndarray, np.ndarray]] = {}
+        self.delta_dir = self.model_dir / "delta"
+        self.check_interval = check_interval
+        self._applied: set = set()
+        self._seq = itertools.count()
+        self.refresh()
+        self._checked_at = time.monotonic()
+
+    def _mmap(self, name: str) -> np.ndarray:
+        return np.load(self.model_dir / f"{name}.npy", mmap_mode="r")
+
+    @classmethod
+    def load_if_present(cls, model_dir: Path = CONTENT_INDEX_DIR) -> Optional["ContentIndex"]:
+        model_dir = Path(model_dir)
+        if not (model_dir / "postings_indptr.npy").exists():
+            print(f"⚠️ No content index in {model_dir}; /similar will use genre similarity.")
+            return None
+        try:
+            index = cls(model_dir)
+        except Exception as e:
+            print(f"❌ Failed to load content index from {model_dir}: {e}")
+            return None
+        print(f"📝 Content index loaded: {len(index.item_ids)} movies (+{len(index.delta)} synced)")
+        return index
+
+    def vector(self, movie: Dict) -> Tuple[np.ndarray, np.ndarray]:
+        return tfidf(term_counts(movie), self.idf)
+
+    def _accumulate(self, features: np.ndarray, weights: np.ndarray) -> np.ndarray:
+        """Dot product of a query vector with every base document, via the query's posting lists."""
+        starts, stops = self.indptr[features], self.indptr[features + 1]
+        keep = (stops - starts) <= self.max_postings
+        if not keep.any():
+            keep[:] = True
+        starts, lengths, weights = starts[keep], (stops - starts)[keep], weights[keep]
+        # all kept posting lists gathered with one fancy index
+        ends = np.cumsum(lengths)
+        slots = np.repeat(starts - ends + lengths, lengths) + np.arange(ends[-1] if len(ends) else 0)
+        contrib = np.asarray(self.weights[slots], dtype=np.float64) * np.repeat(weights, lengths)
+        return np.bincount(np.asarray(self.docs[slots]), contrib, minlength=len(self.item_ids))
+
+    def profile_scores(self, vectors: Iterable[Tuple[np.ndarray, np.ndarray]]) -> Optional[np.ndarray]:
+        """Cosine of every base document with the centroid of `vectors` (from `vector()`), None if all empty."""
+        vectors = [v for v in vectors if len(v[0])]
+        if not vectors:
+            return None
+        features, inverse = np.unique(np.concatenate([f for f, _ in vectors]), return_inverse=True)
+        weights = np.bincount(inverse, np.concatenate([w for _, w in vectors]).astype(np.float64))
+        return self._accumulate(features, weights / np.linalg.norm(weights))
+
+    def similar(self, movie: Dict, k: int = 12) -> List[Tuple[str, float]]:
+        """(movieId, cosine) of the k movies most similar to `movie`, excluding itself."""
+        features, weights = self.vector(movie)
+        if not len(features):
+            return []
+        scores = self._accumulate(features, weights)
+
+        self._maybe_refresh()
+        with self._lock:
+            removed = [self.row[m] for m in self.removed if m in self.row]
+            delta = list(self.delta.items())
+        own = self.row.get(str(movie.get("movieId")))
+        if own is not None:
+            removed.append(own)
+        scores[removed] = 0.0
+
+        results = []
+        if np.count_nonzero(scores):
+            top = np.argpartition(-scores, min(k, len(scores)) - 1)[:k]
+            results = [(self.item_ids[i], float(scores[i])) for i in top.tolist() if scores[i] > 0]
+
+        # synced movies: exact sparse dot products against the query
+        query = dict(zip(features.tolist(), weights.tolist()))
+        own_id = str(movie.get("movieId"))
+        for movie_id, (f, w) in delta:
+            if movie_id != own_id:
+                score = sum(query.get(i, 0.0) * x for i, x in zip(f.tolist(), w.tolist()))
+                if score > 0:
+                    results.append((movie_id, score))
+        results.sort(key=lambda t: -t[1])
+        return results[:k]
+
+    def upsert(self, movies: Iterable[Dict]) -> None:
+        """Index newly synced movies (replacing any earlier version of the same movieId)."""
+        vectors = {str(movie.get("movieId")): self.vector(movie) for movie in movies}
+        if not vectors:
+            return
+        with self._lock:
+            self._apply(vectors, [])
+        self._write_segment(vectors, [])
+
+    def remove(self, movie_ids: Iterable[str]) -> None:
+        removed = list(dict.fromkeys(map(str, movie_ids)))
+        if not removed:
+            return
+        with self._lock:
+            self._apply({}, removed)
+        self._write_segment({}, removed)
+
+    def _apply(self, vectors: Dict[str, Tuple[np.ndarray, np.ndarray]], removed: List[str]) -> None:
+        for movie_id in removed:
+            self.delta.pop(movie_id, None)
+            if movie_id in self.row:
+                self.removed.add(movie_id)
+        for movie_id, vector in vectors.items():
+            if movie_id in self.row:
+                self.removed.add(movie_id)
+            self.delta[movie_id] = vector
+
+    def _write_segment(self, vectors: Dict[str, Tuple[np.ndarray, np.ndarray]], removed: List[str]) -> None:
+        # named by write time, so segments replay in order on load
+        name = f"{time.time_ns():020d}-{os.getpid()}-{next(self._seq)}.npz"
+        self.delta_dir.mkdir(exist_ok=True)
+        tmp = self.delta_dir / f".{name}"
+        ids = list(vectors)
+        np.savez(
+            tmp,
+            ids=np.array(ids, dtype=str),
+            indptr=np.cumsum([0] + [len(vectors[m][0]) for m in ids]),
+            features=np.concatenate([vectors[m][0] for m in ids]) if ids else np.empty(0, dtype=np.int32),
+            weights=np.concatenate([vectors[m][1] for m in ids]) if ids else np.empty(0, dtype=np.float32),
+            removed=np.array(removed, dtype=str),
+        )
+        os.replace(tmp, self.delta_dir / name)
+        with self._lock:
+            self._applied.add(name)
+
+    def _read_segment(self, path: Path) -> Tuple[Dict[str, Tuple[np.ndarray, np.ndarray]], List[str]]:
+        with np.load(path) as data:
+            indptr, features, weights = data["indptr"], data["features"], data["weights"]
+            vectors = {
+                movie_id: (features[indptr[i]:indptr[i + 1]], weights[indptr[i]:indptr[i + 1]])
+                for i, movie_id in enumerate(data["ids"].tolist())
+            }
+            return vectors, data["removed"].tolist()
+
+    def refresh(self) -> int:
+        """Apply delta segments written since the last check (by any worker); returns how many."""
+        if not self.delta_dir.is_dir():
+            return 0
+        names = sorted(p.name for p in self.delta_dir.glob("*.npz") if not p.name.startswith("."))
+        applied = 0
+        for name in names:
+            with self._lock:
+                if name in self._applied:
+                    continue
+            try:
+                vectors, removed = self._read_segment(self.delta_dir / name)
+            except FileNotFoundError:
+                continue  # dropped by a rebuild in the meantime
+            with self._lock:
+                if name not in self._applied:
+                    self._apply(vectors, removed)
+                    self._applied.add(name)
+                    applied += 1
+        return applied
+
+    def _maybe_refresh(self) -> None:
+        now = time.monotonic()
+        if now - self._checked_at < self.check_interval:
+            return
+        self._checked_at = now
+        try:
+            self.refresh()
+        except Exception as e:
+            print(f"❌ Failed to read content index delta: {e}")
+
+
+def get_content_index(request: Request) -> Optional[ContentIndex]:
+    return getattr(request.app.state, "content_index", None)
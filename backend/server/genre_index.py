@@ -0,0 +1,122 @@
+import re
+import threading
+from typing import Any, Dict, Iterable, List, Optional, Tuple, Union
+
+import numpy as np
+
+from server.catalog import CatalogSnapshot
+from server.genres import normalize_genres
+
+Bitmap = int  # bit i set <=> catalog row i is in the set
+
+
+def _signature(value: Any) -> Union[str, Tuple[str, ...], None]:
+    if isinstance(value, str):
+        return value
+    if isinstance(value, list):
+        return tuple(v for v in value if isinstance(v, str))
+    return None
+
+
+def _bitmap_from_mask(mask: np.ndarray) -> Bitmap:
+    return int.from_bytes(np.packbits(mask, bitorder="little").tobytes(), "little")
+
+
+class GenreIndex:
+    """Inverted index from genre values to bitmaps over catalog rows.
+
+    Rows are grouped by their raw `genres` value (a "signature": the stored
+    string, or the tuple of list items). A case-insensitive regex term is
+    evaluated once per distinct signature, exactly the way Mongo's `$regex`
+    would see that value, and the matching signatures' bitmaps are OR-ed
+    together. Filtering, union and intersection are then plain integer
+    bit operations and the rows matched are the same as a collection scan.
+    """
+
+    def __init__(self, movies: List[Dict[str, Any]]):
+        self.size = len(movies)
+        codes = np.empty(self.size, dtype=np.int32)
+        code_of: Dict[Any, int] = {}
+        for i, movie in enumerate(movies):
+            sig = _signature(movie.get("genres"))
+            code = code_of.get(sig)
+            if code is None:
+                code = code_of[sig] = len(code_of)
+            codes[i] = code
+
+        self._signatures: List[Tuple[Any, Bitmap]] = [
+            (sig, _bitmap_from_mask(codes == code)) for sig, code in code_of.items()
+        ]
+
+        self.vocabulary: Dict[str, Bitmap] = {}
+        for sig, bits in self._signatures:
+            if sig is None:
+                continue
+            for token in normalize_genres(sig):
+                self.vocabulary[token] = self.vocabulary.get(token, 0) | bits
+
+        self.playable: Bitmap = _bitmap_from_mask(np.fromiter(
+            (bool(m.get("poster_url")) and bool(m.get("trailer_url")) for m in movies),
+            dtype=bool, count=self.size,
+        ))
+
+        self._term_cache: Dict[str, Bitmap] = {}
+        self._lock = threading.Lock()
+
+    @classmethod
+    def for_snapshot(cls, snapshot: CatalogSnapshot) -> "GenreIndex":
+        return snapshot.derived("genre_index", lambda snap: cls(snap.movies))
+
+    def match(self, term: str) -> Bitmap:
+        """Rows whose genres match `term` as a case-insensitive, unanchored regex."""
+        bits = self._term_cache.get(term)
+        if bits is not None:
+            return bits
+        pattern = re.compile(term, re.IGNORECASE)
+        bits = 0
+        for sig, sig_bits in self._signatures:
+            if isinstance(sig, str):
+                hit = pattern.search(sig) is not None
+            elif sig is not None:
+                hit = any(pattern.search(v) is not None for v in sig)
+            else:
+                hit = False
+            if hit:
+                bits |= sig_bits
+        with self._lock:
+            if len(self._term_cache) > 1024:
+                self._term_cache.clear()
+            self._term_cache[term] = bits
+        return bits
+
+    def match_any(self, terms: Iterable[str]) -> Bitmap:
+        bits = 0
+        for term in terms:
+            bits |= self.match(term)
+        return bits
+
+    def match_all(self, terms: Iterable[str]) -> Bitmap:
+        bits: Optional[Bitmap] = None
+        for term in terms:
+            bits = self.match(term) if bits is None else bits & self.match(term)
+            if not bits:
+                return 0
+        return bits or 0
+
+    def genre(self, name: str) -> Bitmap:
+        """Exact (case-insensitive) genre name lookup in the vocabulary."""
+        return self.vocabulary.get(name.strip().lower(), 0)
+
+    def mask(self, bits: Bitmap) -> np.ndarray:
+        """The bitmap as a boolean array over catalog rows."""
+        raw = np.frombuffer(bits.to_bytes((self.size + 7) // 8, "little"), dtype=np.uint8)
+        return np.unpackbits(raw, bitorder="little")[:self.size].astype(bool)
+
+    def positions(self, bits: Bitmap, limit: Optional[int] = None) -> List[int]:
+        """Ascending row positions of the set bits, optionally only the first `limit`."""
+        if not bits:
+            return []
+        found = np.flatnonzero(self.mask(bits))
+        if limit is not None:
+            found = found[:limit]
+        return found.tolist()
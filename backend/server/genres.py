@@ -0,0 +1,123 @@
+import re
+from collections import Counter
+from datetime import datetime
+from typing import Any, Dict, List, Optional
+
+_SEPARATORS = re.compile(r"[|,]")
+
+
+def normalize_genres(value: Any) -> List[str]:
+    """Canonical genres: a de-duplicated list of trimmed, lowercase names.
+
+    Accepts the legacy shapes found in the data: a "|" separated string
+    (MovieLens export), a "," separated string (admin uploads) or a list.
+    """
+    if isinstance(value, str):
+        parts = _SEPARATORS.split(value)
+    elif isinstance(value, (list, tuple)):
+        parts = [p for item in value if isinstance(item, str) for p in _SEPARATORS.split(item)]
+    else:
+        return []
+
+    out: List[str] = []
+    seen = set()
+    for part in parts:
+        name = part.strip().lower()
+        if name and name not in seen:
+            seen.add(name)
+            out.append(name)
+    return out
+
+
+def genre_list(value: Any) -> List[str]:
+    """Read-path accessor: migrated documents already store the canonical array."""
+    if isinstance(value, list):
+        return value
+    return normalize_genres(value)
+
+
+# Materialized genre facet: one document in sync_metadata holding per-genre
+# movie counts, kept up to date by the catalog write endpoints.
+GENRE_FACET_ID = "genre_facet"
+# bumped when the counting changes; a facet written under another version is rebuilt
+GENRE_FACET_VERSION = 2
+
+
+def _facet_key(name: str) -> str:
+    # Mongo field names cannot contain "." or start with "$"
+    return name.replace(".", "．").replace("$", "＄")
+
+
+def _facet_name(key: str) -> str:
+    return key.replace("．", ".").replace("＄", "$")
+
+
+def count_genres(docs) -> Counter:
+    """Per-genre movie counts. The per-prediction layout stores one row per
+    prediction, so rows sharing a movieId are counted once."""
+    counts: Counter = Counter()
+    seen = set()
+    for doc in docs:
+        movie_id = doc.get("movieId")
+        if movie_id is not None:
+            if str(movie_id) in seen:
+                continue
+            seen.add(str(movie_id))
+        counts.update(normalize_genres(doc.get("genres")))
+    return counts
+
+
+def movie_ids_present(collection, movie_ids) -> set:
+    """The given movieIds that still have at least one row in the catalog."""
+    ids = list({str(mid) for mid in movie_ids if mid is not None})
+    if not ids:
+        return set()
+    return {str(doc["movieId"]) for doc in collection.find({"movieId": {"$in": ids}}, {"movieId": 1, "_id": 0})}
+
+
+def apply_genre_counts(db, delta: Counter) -> None:
+    """Increment/decrement facet counts in a single update."""
+    inc = {f"counts.{_facet_key(g)}": n for g, n in delta.items() if n}
+    if not inc:
+        return
+    db["sync_metadata"].update_one(
+        {"_id": GENRE_FACET_ID},
+        {"$inc": inc, "$set": {"updatedAt": datetime.utcnow()}},
+        upsert=True,
+    )
+
+
+def rebuild_genre_facet(db, collection: str) -> Dict[str, int]:
+    """Recount the facet from scratch (first use, or after a bulk migration)."""
+    counts = count_genres(db[collection].find({}, {"genres": 1, "movieId": 1, "_id": 0}).batch_size(2000))
+    db["sync_metadata"].replace_one(
+        {"_id": GENRE_FACET_ID},
+        {
+            "counts": {_facet_key(g): n for g, n in counts.items()},
+            "version": GENRE_FACET_VERSION,
+            "updatedAt": datetime.utcnow(),
+        },
+        upsert=True,
+    )
+    return dict(counts)
+
+
+# Stored genres are lowercase (see normalize_genres); the API shows the
+# MovieLens casing. Names not listed here are title-cased word by word.
+GENRE_DISPLAY_NAMES = {
+    "imax": "IMAX",
+    "(no genres listed)": "(no genres listed)",
+}
+
+
+def display_genre(name: str) -> str:
+    if name in GENRE_DISPLAY_NAMES:
+        return GENRE_DISPLAY_NAMES[name]
+    return re.sub(r"(^|[\s\-/])([a-z])", lambda m: m.group(1) + m.group(2).upper(), name)
+
+
+def read_genre_facet(db) -> Optional[Dict[str, int]]:
+    doc = db["sync_metadata"].find_one({"_id": GENRE_FACET_ID}, {"counts": 1, "version": 1})
+    if doc is None or doc.get("version") != GENRE_FACET_VERSION:
+        return None
+    return {_facet_name(k): n for k, n in (doc.get("counts") or {}).items() if n > 0}
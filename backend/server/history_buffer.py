@@ -0,0 +1,165 @@
+import os
+import threading
+import time
+from collections import OrderedDict, deque
+from datetime import datetime
+from typing import Any, Dict, Optional
+
+from fastapi import Request
+from pymongo import UpdateOne
+
+from server.interactions import add_many_update
+
+# seconds a history event may wait before it is written; 0 writes synchronously
+HISTORY_FLUSH_WINDOW = float(os.getenv("HISTORY_FLUSH_WINDOW", "2"))
+# pending events that trigger a flush before the window is up
+HISTORY_BUFFER_MAX = int(os.getenv("HISTORY_BUFFER_MAX", "5000"))
+# flush latencies kept for the percentiles in stats()
+LATENCY_SAMPLES = 200
+
+
+class HistoryBuffer:
+    """Write-behind queue for /history events.
+
+    Views are coalesced per user: a movie seen twice in one window is kept
+    once, at the position of its latest view. A background thread flushes
+    every `window` seconds (sooner once `max_pending` events are waiting)
+    with one bulk_write. Each user gets a single pipeline update applying
+    all of their events (see interactions.add_many_update), so a burst of
+    views rewrites historyObjects once instead of once per view.
+
+    Anything that reads or deletes a user's history should call
+    flush(user_id) first. Flushes hold a lock, so that call also waits for
+    a background flush that already took the user's events. A failed write
+    puts its events back for the next flush.
+    """
+
+    def __init__(self, collection, window: float = HISTORY_FLUSH_WINDOW, max_pending: int = HISTORY_BUFFER_MAX):
+        self.collection = collection
+        self.window = window
+        self.max_pending = max_pending
+        self._pending: "OrderedDict[str, OrderedDict[str, datetime]]" = OrderedDict()
+        self._depth = 0
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stop = threading.Event()
+        self._thread: Optional[threading.Thread] = None
+        self._latencies = deque(maxlen=LATENCY_SAMPLES)
+        self.counters = {"enqueued": 0, "coalesced": 0, "flushes": 0, "flushedEvents": 0, "errors": 0}
+
+    def start(self) -> None:
+        if self._thread is None:
+            self._stop.clear()
+            self._thread = threading.Thread(target=self._flush_loop, name="history-flush", daemon=True)
+            self._thread.start()
+
+    def close(self) -> None:
+        """Stop the flush thread and write whatever is still pending."""
+        self._stop.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def add(self, user_id: str, movie_id: str, ts: Optional[datetime] = None) -> None:
+        user_id, movie_id = str(user_id), str(movie_id)
+        with self._lock:
+            events = self._pending.setdefault(user_id, OrderedDict())
+            if movie_id in events:
+                del events[movie_id]
+                self.counters["coalesced"] += 1
+            else:
+                self._depth += 1
+            events[movie_id] = ts or datetime.utcnow()
+            self.counters["enqueued"] += 1
+            full = self._depth >= self.max_pending
+        if full:
+            self._wake.set()
+
+    def _flush_loop(self) -> None:
+        while not self._stop.is_set():
+            self._wake.wait(self.window)
+            self._wake.clear()
+            try:
+                self.flush()
+            except Exception as e:
+                print(f"❌ History flush failed: {e}")
+
+    def _take(self, user_id: Optional[str]) -> Dict[str, "OrderedDict[str, datetime]"]:
+        with self._lock:
+            if user_id is None:
+                taken, self._pending = dict(self._pending), OrderedDict()
+            else:
+                events = self._pending.pop(str(user_id), None)
+                taken = {str(user_id): events} if events else {}
+            self._depth -= sum(len(events) for events in taken.values())
+        return taken
+
+    def _requeue(self, taken: Dict[str, "OrderedDict[str, datetime]"]) -> None:
+        # failed events go back in front of anything queued since
+        with self._lock:
+            for user_id, events in taken.items():
+                newer = self._pending.pop(user_id, OrderedDict())
+                merged = OrderedDict((mid, ts) for mid, ts in events.items() if mid not in newer)
+                merged.update(newer)
+                self._pending[user_id] = merged
+                self._depth += len(merged) - len(newer)
+
+    def flush(self, user_id: Optional[str] = None) -> int:
+        """Write pending events (only user_id's when given); returns how many were written."""
+        with self._flush_lock:
+            taken = self._take(user_id)
+            if not taken:
+                return 0
+            ops = [
+                UpdateOne({"userId": uid}, add_many_update("history", list(events.items())), upsert=True)
+                for uid, events in taken.items()
+            ]
+            written = sum(len(events) for events in taken.values())
+            started = time.perf_counter()
+            try:
+                self.collection.bulk_write(ops, ordered=False)
+            except Exception:
+                self._requeue(taken)
+                with self._lock:
+                    self.counters["errors"] += 1
+                raise
+            elapsed = (time.perf_counter() - started) * 1000
+            with self._lock:
+                self.counters["flushes"] += 1
+                self.counters["flushedEvents"] += written
+                self._latencies.append(elapsed)
+            return written
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+
+            def pct(q: float) -> float:
+                return round(latencies[min(int(q * len(latencies)), len(latencies) - 1)], 2) if latencies else 0.0
+
+            return {
+                "enabled": True,
+                **self.counters,
+                "depth": self._depth,
+                "users": len(self._pending),
+                "lastFlushMs": round(self._latencies[-1], 2) if self._latencies else 0.0,
+                "p50FlushMs": pct(0.5),
+                "p99FlushMs": pct(0.99),
+                "maxFlushMs": round(latencies[-1], 2) if latencies else 0.0,
+                "windowSeconds": self.window,
+                "maxPending": self.max_pending,
+            }
+
+
+def get_history_buffer(request: Request) -> Optional[HistoryBuffer]:
+    return getattr(request.app.state, "history_buffer", None)
+
+
+def flush_history(request: Request, user_id: str) -> None:
+    """Make the user's buffered views visible before their history is read or changed."""
+    buffer = get_history_buffer(request)
+    if buffer is not None:
+        buffer.flush(user_id)
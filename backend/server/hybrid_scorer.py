@@ -0,0 +1,254 @@
+import os
+import random
+from typing import Dict, List, NamedTuple, Optional, Sequence
+
+import numpy as np
+from fastapi import Request
+
+from server.als_engine import AlsEngine, get_als_engine
+from server.catalog import CatalogSnapshot, get_catalog
+from server.catalog_columns import CatalogColumns
+from server.content_index import ContentIndex, get_content_index
+from server.genres import normalize_genres
+from server.recommender import GenreMatrix, title_pool
+
+SIGNALS = ("als", "content", "genre", "popularity")
+DEFAULT_WEIGHTS = {"als": 0.4, "content": 0.2, "genre": 0.3, "popularity": 0.1}
+# users x candidates cells scored per block; bounds the dense score matrices (4 bytes a cell each)
+CHUNK_CELLS = 4_000_000
+# interacted movies used for the content profile; lists are appended to, so the tail is the most recent
+CONTENT_SEEDS = 50
+CONTENT_VECTOR_CACHE = 20_000
+
+
+def parse_weights(spec: str) -> Dict[str, float]:
+    """Signal weights from "als=0.5,genre=0.3,...": listed signals override the defaults."""
+    weights = dict(DEFAULT_WEIGHTS)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        name, _, value = item.partition("=")
+        name = name.strip()
+        if name not in SIGNALS:
+            raise ValueError(f"Unknown hybrid signal {name!r}; expected one of {', '.join(SIGNALS)}")
+        weights[name] = max(float(value), 0.0)
+    return weights
+
+
+HYBRID_WEIGHTS = parse_weights(os.getenv("HYBRID_WEIGHTS", ""))
+
+
+class UserProfile(NamedTuple):
+    user_id: str
+    genres: Sequence[str] = ()  # explicitly chosen genres (users.streamer)
+    interacted: Sequence[str] = ()  # liked / saved / watched movieIds, oldest first
+    exclude_ids: Sequence[str] = ()
+    exclude_titles: Sequence[str] = ()
+    allowed: Optional[np.ndarray] = None  # catalog positions to choose from (None: the whole title pool)
+
+
+class HybridCandidates:
+    """Per-snapshot candidate arrays: the title pool aligned with every signal's rows."""
+
+    def __init__(self, snapshot: CatalogSnapshot, als: Optional[AlsEngine], content: Optional[ContentIndex]):
+        self.genres = GenreMatrix.for_snapshot(snapshot)
+        self.pool = title_pool(snapshot)
+        self.movie_ids = [str(snapshot.movies[pos].get("movieId")) for pos in self.pool.tolist()]
+        self.pool_row = self.genres.pool_row
+        self.position_row = np.full(len(snapshot.movies), -1, dtype=np.int64)
+        self.position_row[self.pool] = np.arange(len(self.pool))
+        self.title_row = {snapshot.movies[pos].get("title"): row for row, pos in enumerate(self.pool.tolist())}
+        self.genre_matrix = self.genres.matrix.astype(np.float32)
+
+        self.item_factors = None
+        if als is not None:
+            rows = np.array([als.item_row.get(m, -1) for m in self.movie_ids], dtype=np.int64)
+            self.item_factors = np.zeros((len(rows), als.item_factors.shape[1]), dtype=np.float32)
+            self.item_factors[rows >= 0] = als.item_factors[rows[rows >= 0]]
+
+        self.content_rows = None
+        if content is not None:
+            self.content_rows = np.array([content.row.get(m, -1) for m in self.movie_ids], dtype=np.int64)
+
+        self.popularity = self._popularity(snapshot)
+
+    def _popularity(self, snapshot: CatalogSnapshot) -> np.ndarray:
+        # how many users a title was predicted for: its row count in the
+        # per-prediction layout, prediction_count in the split layout;
+        # its predicted_rating when neither tells titles apart
+        rows = [snapshot.movies[pos] for pos in self.pool.tolist()]
+        if any(m.get("prediction_count") for m in rows):
+            return np.log1p([float(m.get("prediction_count") or 0) for m in rows]).astype(np.float32)
+        ids = np.array([str(m.get("movieId")) for m in snapshot.movies], dtype=str)
+        unique, counts = np.unique(ids, return_counts=True)
+        if len(counts) and counts.min() != counts.max():
+            lookup = dict(zip(unique.tolist(), np.log1p(counts).tolist()))
+            return np.array([lookup[m] for m in self.movie_ids], dtype=np.float32)
+        ratings = CatalogColumns.for_snapshot(snapshot).ratings[self.pool]
+        return np.nan_to_num(ratings, nan=0.0).astype(np.float32)
+
+
+def _minmax(scores: np.ndarray) -> np.ndarray:
+    """Rows rescaled to [0, 1]; constant rows become all zeros."""
+    low = scores.min(axis=1, keepdims=True)
+    span = scores.max(axis=1, keepdims=True) - low
+    with np.errstate(invalid="ignore", divide="ignore"):
+        return np.where(span > 0, (scores - low) / span, 0.0).astype(np.float32)
+
+
+class HybridScorer:
+    """Blends ALS, content, genre and popularity scores for a batch of users.
+
+    Every signal is a users x candidates matrix over the title pool:
+
+      als         user factors (trained or folded in) times item factors
+      content     cosine with the centroid of the user's interacted movies
+      genre       share of the user's genres a title has (chosen genres
+                  plus those of the interacted movies)
+      popularity  the same row for every user
+
+    Each signal is min-max scaled per user, then blended with the configured
+    weights renormalised over the signals that user actually has (a new
+    user without interactions is ranked by genre and popularity alone).
+    Interacted and excluded titles are masked before the per-row top k, as
+    is everything outside a profile's `allowed` positions (e.g. its genre pool).
+    """
+
+    def __init__(self, snapshot: CatalogSnapshot, als: Optional[AlsEngine] = None,
+                 content: Optional[ContentIndex] = None, weights: Optional[Dict[str, float]] = None):
+        self.snapshot = snapshot
+        self.als = als
+        self.content = content
+        self.weights = np.array([(weights or HYBRID_WEIGHTS).get(s, 0.0) for s in SIGNALS], dtype=np.float32)
+        self.candidates: HybridCandidates = snapshot.memo(
+            "hybrid_candidates", (id(als), id(content)), lambda: HybridCandidates(snapshot, als, content), maxsize=4,
+        )
+
+    def _als_scores(self, profiles: Sequence[UserProfile]) -> Optional[np.ndarray]:
+        if self.als is None or not self.weights[0]:
+            return None
+        vectors = [self.als.user_vector(p.user_id, p.interacted) for p in profiles]
+        if all(v is None for v in vectors):
+            return None
+        users = np.zeros((len(profiles), self.candidates.item_factors.shape[1]), dtype=np.float32)
+        for i, v in enumerate(vectors):
+            if v is not None:
+                users[i] = v
+        return users @ self.candidates.item_factors.T
+
+    def _content_vector(self, movie_id: str):
+        # tokenising is the costly part of a content profile, and the same
+        # seed movies recur across users and requests
+        def build():
+            movie = self.snapshot.movie(movie_id)
+            return self.content.vector(movie) if movie is not None else self.content.vector({})
+
+        return self.snapshot.memo("content_vectors", (id(self.content), str(movie_id)), build, maxsize=CONTENT_VECTOR_CACHE)
+
+    def _content_scores(self, profiles: Sequence[UserProfile]) -> Optional[np.ndarray]:
+        if self.content is None or not self.weights[1]:
+            return None
+        rows = self.candidates.content_rows
+        scores = np.zeros((len(profiles), len(rows)), dtype=np.float32)
+        found = False
+        for i, p in enumerate(profiles):
+            base = self.content.profile_scores(self._content_vector(m) for m in list(p.interacted)[-CONTENT_SEEDS:])
+            if base is not None:
+                scores[i] = np.where(rows >= 0, base[rows], 0.0)
+                found = True
+        return scores if found else None
+
+    def _genre_scores(self, profiles: Sequence[UserProfile]) -> np.ndarray:
+        vocab = self.candidates.genres.vocab
+        wanted = np.zeros((len(profiles), self.candidates.genre_matrix.shape[1]), dtype=np.float32)
+        for i, p in enumerate(profiles):
+            genres = set(normalize_genres(list(p.genres or [])))
+            for movie in map(self.snapshot.movie, p.interacted):
+                if movie is not None:
+                    genres.update(normalize_genres(movie.get("genres")))
+            cols = [vocab[g] for g in genres if g in vocab]
+            if cols:
+                wanted[i, cols] = 1.0 / len(cols)
+        return wanted @ self.candidates.genre_matrix.T
+
+    def _exclusions(self, profiles: Sequence[UserProfile]):
+        pool_row, title_row = self.candidates.pool_row, self.candidates.title_row
+        users, rows = [], []
+        for i, p in enumerate(profiles):
+            hits = {pool_row[m] for m in map(str, [*p.interacted, *p.exclude_ids]) if m in pool_row}
+            hits.update(title_row[t] for t in p.exclude_titles if t in title_row)
+            users.extend([i] * len(hits))
+            rows.extend(hits)
+        return np.asarray(users, dtype=np.int64), np.asarray(rows, dtype=np.int64)
+
+    def _restrict(self, blended: np.ndarray, profiles: Sequence[UserProfile]) -> None:
+        for i, p in enumerate(profiles):
+            if p.allowed is not None:
+                rows = self.candidates.position_row[np.asarray(p.allowed, dtype=np.int64)]
+                keep = np.zeros(blended.shape[1], dtype=bool)
+                keep[rows[rows >= 0]] = True
+                blended[i, ~keep] = -np.inf
+
+    def scores(self, profiles: Sequence[UserProfile]) -> np.ndarray:
+        """Blended users x candidates scores in [0, 1], -inf where a title is excluded or not allowed."""
+        n, m = len(profiles), len(self.candidates.pool)
+        signals = [
+            self._als_scores(profiles),
+            self._content_scores(profiles),
+            self._genre_scores(profiles),
+            np.broadcast_to(self.candidates.popularity, (n, m)),
+        ]
+        weights = np.zeros((n, len(SIGNALS)), dtype=np.float32)
+        scaled = []
+        for s, raw in enumerate(signals):
+            if raw is None:
+                scaled.append(None)
+                continue
+            scaled.append(_minmax(raw))
+            # a constant row (e.g. an unknown user's zero ALS vector) carries no preference
+            weights[:, s] = np.where(np.ptp(raw, axis=1) > 0, self.weights[s], 0.0)
+        total = weights.sum(axis=1, keepdims=True)
+        weights = np.divide(weights, total, out=np.zeros_like(weights), where=total > 0)
+
+        blended = np.zeros((n, m), dtype=np.float32)
+        for s, matrix in enumerate(scaled):
+            if matrix is not None:
+                blended += weights[:, s:s + 1] * matrix
+        blended[self._exclusions(profiles)] = -np.inf
+        self._restrict(blended, profiles)
+        return blended
+
+    def top(self, profiles: Sequence[UserProfile], k: int) -> List[List[int]]:
+        """Per profile, catalog positions of its k best-blended titles, best first."""
+        m = len(self.candidates.pool)
+        if not m or k <= 0:
+            return [[] for _ in profiles]
+        k = min(k, m)
+        step = max(1, CHUNK_CELLS // m)
+        results: List[List[int]] = []
+        for start in range(0, len(profiles), step):
+            blended = self.scores(profiles[start:start + step])
+            top = np.argpartition(-blended, k - 1, axis=1)[:, :k]
+            order = np.argsort(-np.take_along_axis(blended, top, axis=1), axis=1, kind="stable")
+            top = np.take_along_axis(top, order, axis=1)
+            for row, cols in zip(blended, top):
+                cols = cols[np.isfinite(row[cols])]
+                results.append(self.candidates.pool[cols].tolist())
+        return results
+
+    def recommend(self, profiles: Sequence[UserProfile], k: int, spread: int = 1,
+                  rngs: Optional[Sequence[random.Random]] = None) -> List[List[int]]:
+        """Like `top`, but with spread > 1 draws k of the best k * spread (kept in rank order),
+        so regenerating a list brings in fresh titles without leaving the user's best matches."""
+        ranked = self.top(profiles, k * max(spread, 1))
+        if spread <= 1:
+            return ranked
+        out = []
+        for i, positions in enumerate(ranked):
+            rng = rngs[i] if rngs else random
+            if len(positions) > k:
+                positions = [positions[j] for j in sorted(rng.sample(range(len(positions)), k))]
+            out.append(positions)
+        return out
+
+
+def get_hybrid_scorer(request: Request) -> HybridScorer:
+    return HybridScorer(get_catalog(request), get_als_engine(request), get_content_index(request))
@@ -0,0 +1,92 @@
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+# liked / saved / history arrays hold compact {movieId, ts} entries; the
+# movie itself is joined from the catalog on read. Older documents may
+# still hold bare ids or full embedded movie objects.
+ENTRY_ARRAYS = {"liked": "likedMovies", "saved": "SaveMovies", "history": "historyObjects"}
+# history also keeps a parallel id list (ordering, counts, neighbour index)
+HISTORY_IDS = "historyMovies"
+# collection -> array listing the user's movies in order (ids or entries)
+ID_ARRAYS = {"liked": "likedMovies", "saved": "SaveMovies", "history": HISTORY_IDS}
+HISTORY_ENTRIES_CAP = 300
+HISTORY_IDS_CAP = 1000
+# kept on an entry for a movie the catalog does not have, so it still has a card
+FALLBACK_FIELDS = ("title", "poster_url")
+
+
+def interaction_entry(movie_id: str, ts: Optional[datetime] = None, fallback: Optional[Dict] = None) -> Dict:
+    entry = {"movieId": str(movie_id), "ts": ts or datetime.utcnow()}
+    for field in FALLBACK_FIELDS:
+        if fallback and fallback.get(field):
+            entry[field] = fallback[field]
+    return entry
+
+
+def entry_id(item) -> str:
+    if isinstance(item, dict):
+        item = item.get("movieId") or item.get("_id")
+    return "" if item is None else str(item)
+
+
+def bulk_flush(collection, ops: List, dry_run: bool = False) -> int:
+    """Unordered bulk_write of `ops` (skipped on a dry run), then clear them; returns how many there were."""
+    if ops and not dry_run:
+        collection.bulk_write(ops, ordered=False)
+    n = len(ops)
+    ops.clear()
+    return n
+
+
+# entry_id() as an aggregation expression over the array element $$e
+_ENTRY_ID = {"$toString": {"$ifNull": ["$$e.movieId", {"$ifNull": ["$$e._id", "$$e"]}]}}
+
+
+def _without(field: str, movie_ids: Iterable[str]) -> Dict:
+    """The array in `field` minus every entry for movie_ids, whatever its shape."""
+    return {"$filter": {
+        "input": {"$ifNull": [f"${field}", []]},
+        "as": "e",
+        "cond": {"$not": {"$in": [_ENTRY_ID, {"$literal": [str(mid) for mid in movie_ids]}]}},
+    }}
+
+
+def _append(field: str, movie_ids: List[str], values: List, cap: Optional[int]) -> Dict:
+    # ids and entries are client data: $literal keeps a "$..." value from being read as a field path
+    appended = {"$concatArrays": [_without(field, movie_ids), {"$literal": values}]}
+    return {"$slice": [appended, -cap]} if cap else appended
+
+
+def add_update(collection: str, movie_id: str, ts: Optional[datetime] = None,
+               fallback: Optional[Dict] = None) -> List[Dict]:
+    """Pipeline update moving movie_id to the end of the user's list (added if absent).
+
+    Replaces the old $pull + $push pair: one atomic write per event, and
+    legacy id / object entries for the movie are dropped in the same pass.
+    `fallback` is a movie object whose FALLBACK_FIELDS are kept on the entry.
+    """
+    return _add_entries(collection, [str(movie_id)], [interaction_entry(movie_id, ts, fallback)])
+
+
+def add_many_update(collection: str, events: Sequence[Tuple[str, Optional[datetime]]]) -> List[Dict]:
+    """add_update for several (movie_id, ts) events of one user, applied in order.
+
+    Each movie_id must appear once (the last occurrence is the one that counts).
+    """
+    return _add_entries(collection, [str(mid) for mid, _ in events], [interaction_entry(mid, ts) for mid, ts in events])
+
+
+def _add_entries(collection: str, movie_ids: List[str], entries: List[Dict]) -> List[Dict]:
+    if collection == "history":
+        return [{"$set": {
+            ENTRY_ARRAYS["history"]: _append(ENTRY_ARRAYS["history"], movie_ids, entries, HISTORY_ENTRIES_CAP),
+            HISTORY_IDS: _append(HISTORY_IDS, movie_ids, movie_ids, HISTORY_IDS_CAP),
+        }}]
+    field = ENTRY_ARRAYS[collection]
+    return [{"$set": {field: _append(field, movie_ids, entries, None)}}]
+
+
+def remove_update(collection: str, movie_id: str) -> List[Dict]:
+    """Pipeline update removing every entry for movie_id (string, numeric, object or _id match)."""
+    fields = [ENTRY_ARRAYS[collection]] + ([HISTORY_IDS] if collection == "history" else [])
+    return [{"$set": {field: _without(field, [movie_id]) for field in fields}}]
@@ -0,0 +1,85 @@
+import os
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+from fastapi import Request
+
+NEIGHBORS_PATH = Path(os.getenv("NEIGHBORS_PATH", Path(__file__).resolve().parent.parent / "models" / "neighbors.npz"))
+
+
+class NeighborIndex:
+    """Top-N item-item neighbours from users' liked / saved / watched lists.
+
+    Built offline by tools.build_neighbors and stored as CSR-style arrays:
+    row i's neighbours are `neighbors[indptr[i]:indptr[i + 1]]` (indices
+    into `item_ids`), best first, with `scores` alongside. Lookups are
+    slices; "because you liked" sums the neighbour lists of the seed movies.
+    """
+
+    def __init__(self, item_ids: np.ndarray, indptr: np.ndarray, neighbors: np.ndarray, scores: np.ndarray):
+        self.item_ids = [str(i) for i in item_ids.tolist()]
+        self.row: Dict[str, int] = {m: i for i, m in enumerate(self.item_ids)}
+        self.indptr = indptr
+        self.neighbors = neighbors
+        self.scores = scores
+
+    @classmethod
+    def load(cls, path: Path = NEIGHBORS_PATH) -> "NeighborIndex":
+        with np.load(path, allow_pickle=False) as data:
+            return cls(data["item_ids"], data["indptr"], data["neighbors"], data["scores"])
+
+    @classmethod
+    def load_if_present(cls, path: Path = NEIGHBORS_PATH) -> Optional["NeighborIndex"]:
+        path = Path(path)
+        if not path.exists():
+            print(f"⚠️ No neighbour index at {path}; co-occurrence endpoints will return nothing.")
+            return None
+        try:
+            index = cls.load(path)
+        except Exception as e:
+            print(f"❌ Failed to load neighbour index from {path}: {e}")
+            return None
+        print(f"🧲 Neighbour index loaded: {len(index.item_ids)} movies, {len(index.neighbors)} pairs")
+        return index
+
+    def _slice(self, row: int) -> Tuple[np.ndarray, np.ndarray]:
+        start, stop = self.indptr[row], self.indptr[row + 1]
+        return self.neighbors[start:stop], self.scores[start:stop]
+
+    def _top(self, candidates: np.ndarray, scores: np.ndarray, exclude: Iterable[str], k: int) -> List[Tuple[str, float]]:
+        excluded = [self.row[m] for m in map(str, exclude) if m in self.row]
+        if excluded:
+            keep = ~np.isin(candidates, excluded)
+            candidates, scores = candidates[keep], scores[keep]
+        if len(candidates) > k:
+            top = np.argpartition(-scores, k - 1)[:k]
+            candidates, scores = candidates[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return [(self.item_ids[i], float(s)) for i, s in zip(candidates[order].tolist(), scores[order].tolist())]
+
+    def similar(self, movie_id: str, k: int = 12, exclude: Iterable[str] = ()) -> List[Tuple[str, float]]:
+        """(movieId, score) of the movies most often liked/saved/watched together with `movie_id`."""
+        row = self.row.get(str(movie_id))
+        if row is None:
+            return []
+        candidates, scores = self._slice(row)
+        return self._top(candidates, scores, exclude, k)
+
+    def because(self, movie_ids: Iterable[str], k: int = 12, exclude: Iterable[str] = ()) -> List[Tuple[str, float]]:
+        """Neighbour lists of all `movie_ids` merged by summed score, never returning the seeds."""
+        seeds = list(dict.fromkeys(str(m) for m in movie_ids))
+        rows = [self.row[m] for m in seeds if m in self.row]
+        if not rows:
+            return []
+        slices = [self._slice(r) for r in rows]
+        candidates = np.concatenate([c for c, _ in slices])
+        if not len(candidates):
+            return []
+        unique, inverse = np.unique(candidates, return_inverse=True)
+        totals = np.bincount(inverse, weights=np.concatenate([s for _, s in slices]))
+        return self._top(unique, totals, [*seeds, *map(str, exclude)], k)
+
+
+def get_neighbors(request: Request) -> Optional[NeighborIndex]:
+    return getattr(request.app.state, "neighbors", None)
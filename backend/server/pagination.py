@@ -0,0 +1,38 @@
+import base64
+import json
+from bisect import bisect_left, bisect_right
+from typing import List
+
+from server.catalog import CatalogSnapshot
+
+
+def encode_cursor(last_id: str) -> str:
+    """Opaque `after` token for keyset pagination over the catalog `_id` order."""
+    raw = json.dumps({"id": last_id}, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str) -> str:
+    """Inverse of encode_cursor(); raises ValueError on a malformed token."""
+    try:
+        padded = token + "=" * (-len(token) % 4)
+        last_id = json.loads(base64.urlsafe_b64decode(padded.encode("ascii")))["id"]
+    except Exception as e:
+        raise ValueError("Invalid pagination cursor") from e
+    if not isinstance(last_id, str):
+        raise ValueError("Invalid pagination cursor")
+    return last_id
+
+
+def start_after(snapshot: CatalogSnapshot, positions: List[int], last_id: str) -> int:
+    """Index into `positions` of the first row strictly after the row `last_id`.
+
+    If that row has since been removed from the catalog, fall back to the
+    ObjectId hex order the snapshot is sorted by.
+    """
+    pos = snapshot.position_of(last_id)
+    if pos is not None:
+        return bisect_right(positions, pos)
+    ids = snapshot.derived("sorted_oids", lambda snap: [m.get("_id") for m in snap.movies])
+    return bisect_left(positions, bisect_right(ids, last_id))
+
@@ -0,0 +1,100 @@
+import math
+import re
+from typing import Dict, Iterable, List
+
+import numpy as np
+
+from server.catalog import CatalogSnapshot
+from server.catalog_columns import CatalogColumns
+from server.genre_index import GenreIndex
+from server.genres import normalize_genres
+
+REGENERATE_SIZE = 60
+# /regenerate draws its list from the best REGENERATE_SPREAD x REGENERATE_SIZE titles
+REGENERATE_SPREAD = 3
+
+
+def title_pool(snapshot: CatalogSnapshot) -> np.ndarray:
+    """One catalog position per playable title: its highest-rated row."""
+    return snapshot.derived(
+        "title_pool",
+        lambda snap: CatalogColumns.for_snapshot(snap).dedupe(np.arange(len(snap.movies))),
+    )
+
+
+def genre_pool(snapshot: CatalogSnapshot, genres: Iterable[str]) -> np.ndarray:
+    """Title-pool positions whose genres match any of `genres` (same matching as /regenerate's regex)."""
+    key = tuple(sorted({g.lower().strip() for g in genres if g and g.strip()}))
+
+    def build():
+        index = GenreIndex.for_snapshot(snapshot)
+        matched = index.mask(index.match_any(re.escape(g) for g in key) & index.playable)
+        pool = title_pool(snapshot)
+        return pool[matched[pool]]
+
+    return snapshot.memo("genre_pool", key, build)
+
+
+def movie_positions(snapshot: CatalogSnapshot) -> Dict[str, int]:
+    """movieId -> catalog position of that title's title-pool row."""
+    def build(snap):
+        return {str(snap.movies[pos].get("movieId")): pos for pos in title_pool(snap).tolist()}
+
+    return snapshot.derived("movie_positions", build)
+
+
+class GenreMatrix:
+    """Multi-hot genre matrix over the title pool (pool rows x genre vocabulary).
+
+    Shared-genre counts against a user's genre profile are a column sum over
+    the profile's genres, so the whole catalog is scored in one array pass.
+    """
+
+    def __init__(self, snapshot: CatalogSnapshot):
+        self.pool = title_pool(snapshot)
+        self.vocab: Dict[str, int] = {}
+        rows, cols = [], []
+        for row, pos in enumerate(self.pool.tolist()):
+            for genre in normalize_genres(snapshot.movies[pos].get("genres")):
+                rows.append(row)
+                cols.append(self.vocab.setdefault(genre, len(self.vocab)))
+        self.matrix = np.zeros((len(self.pool), max(len(self.vocab), 1)), dtype=np.uint8)
+        self.matrix[rows, cols] = 1
+        self.pool_row = {str(snapshot.movies[pos].get("movieId")): row for row, pos in enumerate(self.pool.tolist())}
+        # ties on shared genres go to the better predicted_rating
+        ratings = np.nan_to_num(CatalogColumns.for_snapshot(snapshot).ratings[self.pool], nan=0.0)
+        self.tiebreak = ratings / (max(float(ratings.max(initial=0.0)), 0.0) + 1.0)
+
+    @classmethod
+    def for_snapshot(cls, snapshot: CatalogSnapshot) -> "GenreMatrix":
+        return snapshot.derived("genre_matrix", cls)
+
+    def top(self, genres: Iterable[str], exclude_ids: Iterable[str] = (), k: int = REGENERATE_SIZE) -> List[int]:
+        """Catalog positions of the k titles sharing the most genres with `genres`."""
+        cols = sorted({self.vocab[g] for g in normalize_genres(list(genres)) if g in self.vocab})
+        if not cols or not len(self.pool):
+            return []
+        shared = self.matrix[:, cols].sum(axis=1, dtype=np.int32)
+        eligible = shared > 0
+        excluded = [self.pool_row[m] for m in map(str, exclude_ids) if m in self.pool_row]
+        eligible[excluded] = False
+
+        candidates = np.flatnonzero(eligible)
+        if not len(candidates):
+            return []
+        score = shared[candidates] + self.tiebreak[candidates]
+        if len(candidates) > k:
+            part = np.argpartition(-score, k - 1)[:k]
+            candidates, score = candidates[part], score[part]
+        order = np.argsort(-score, kind="stable")
+        return self.pool[candidates[order]].tolist()
+
+
+def materialize(snapshot: CatalogSnapshot, positions: Iterable[int]) -> List[Dict]:
+    """Copies of the catalog rows at `positions`, with the parsed predicted_rating."""
+    ratings = CatalogColumns.for_snapshot(snapshot).ratings
+    return [
+        {**snapshot.movies[pos], "predicted_rating": None if math.isnan(r) else r}
+        for pos, r in ((pos, float(ratings[pos])) for pos in positions)
+    ]
+
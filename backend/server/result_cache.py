@@ -0,0 +1,131 @@
+import os
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Hashable, Iterable, Optional, Set
+
+from fastapi import Request
+
+RESULT_CACHE_SIZE = int(os.getenv("RESULT_CACHE_SIZE", "10000"))
+RESULT_CACHE_TTL = float(os.getenv("RESULT_CACHE_TTL", "300"))
+
+# what a user's cached results can depend on; write endpoints invalidate by these
+LIKED, SAVED, HISTORY, RECOMMENDED = "liked", "saved", "history", "recommended"
+
+
+class ResultCache:
+    """Per-user cache of endpoint results, with a TTL and LRU eviction.
+
+    Entries are keyed by (userId, key) and tagged with the user data they
+    were computed from (liked, saved, history, recommended). A write
+    endpoint drops exactly the entries of that user that carry the tag it
+    changed. Genre preferences are not a tag: /recommendations serves the
+    stored list (which /regenerate rewrites and invalidates) and the als-*
+    results are built from interactions only, so the preference writers
+    leave the cache alone.
+    Keys of catalog-derived results should include the snapshot version so
+    a catalog reload never serves stale rows.
+
+    Results are computed outside the lock. While a user has a compute in
+    flight, invalidate() bumps that user's generation, and a result
+    computed under an older generation is returned but not stored.
+
+    Only writes made through this process invalidate. Anything else that
+    rewrites the stored lists, such as tools.precompute_recommendations or
+    another worker process, is seen once the TTL runs out.
+    """
+
+    def __init__(self, maxsize: int = RESULT_CACHE_SIZE, ttl: float = RESULT_CACHE_TTL):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._entries: "OrderedDict[tuple[str, Hashable], tuple[float, frozenset, Any]]" = OrderedDict()
+        self._by_user: Dict[str, Set[Hashable]] = {}
+        # userId -> [computes in flight, generation]; only users with a compute running
+        self._inflight: Dict[str, list] = {}
+        self._lock = threading.Lock()
+        self.counters = {"hits": 0, "misses": 0, "expired": 0, "evicted": 0, "invalidated": 0, "discarded": 0}
+
+    def get_or_compute(self, user_id: str, key: Hashable, tags: Iterable[str], compute: Callable[[], Any]) -> Any:
+        user_id = str(user_id)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get((user_id, key))
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end((user_id, key))
+                self.counters["hits"] += 1
+                return entry[2]
+            if entry is not None:
+                self._drop(user_id, key)
+                self.counters["expired"] += 1
+            self.counters["misses"] += 1
+            inflight = self._inflight.setdefault(user_id, [0, 0])
+            inflight[0] += 1
+            generation = inflight[1]
+
+        try:
+            value = compute()
+        except Exception:
+            with self._lock:
+                self._release(user_id, inflight)
+            raise
+        with self._lock:
+            self._release(user_id, inflight)
+            if inflight[1] != generation:
+                # invalidated while computing: the result may predate the write
+                self.counters["discarded"] += 1
+                return value
+            self._entries[(user_id, key)] = (now + self.ttl, frozenset(tags), value)
+            self._entries.move_to_end((user_id, key))
+            self._by_user.setdefault(user_id, set()).add(key)
+            while len(self._entries) > self.maxsize:
+                (old_user, old_key), _ = next(iter(self._entries.items()))
+                self._drop(old_user, old_key)
+                self.counters["evicted"] += 1
+        return value
+
+    def _release(self, user_id: str, inflight: list) -> None:
+        inflight[0] -= 1
+        if not inflight[0]:
+            del self._inflight[user_id]
+
+    def _drop(self, user_id: str, key: Hashable) -> None:
+        self._entries.pop((user_id, key), None)
+        keys = self._by_user.get(user_id)
+        if keys is not None:
+            keys.discard(key)
+            if not keys:
+                del self._by_user[user_id]
+
+    def invalidate(self, user_id: str, *tags: str) -> int:
+        """Drop the user's entries carrying any of `tags` (all of them when no tag is given)."""
+        user_id = str(user_id)
+        with self._lock:
+            if user_id in self._inflight:
+                self._inflight[user_id][1] += 1
+            keys = [
+                key for key in self._by_user.get(user_id, ())
+                if not tags or self._entries[(user_id, key)][1].intersection(tags)
+            ]
+            for key in keys:
+                self._drop(user_id, key)
+            self.counters["invalidated"] += len(keys)
+        return len(keys)
+
+    def stats(self) -> Dict[str, Any]:
+        with self._lock:
+            lookups = self.counters["hits"] + self.counters["misses"]
+            return {
+                **self.counters,
+                "hitRate": self.counters["hits"] / lookups if lookups else 0.0,
+                "entries": len(self._entries),
+                "users": len(self._by_user),
+                "maxsize": self.maxsize,
+                "ttlSeconds": self.ttl,
+            }
+
+
+def get_result_cache(request: Request) -> ResultCache:
+    cache: Optional[ResultCache] = getattr(request.app.state, "result_cache", None)
+    if cache is None:
+        cache = request.app.state.result_cache = ResultCache()
+    return cache
@@ -17,6 +17,7 @@ from pathlib import Path
 from fastapi.responses import JSONResponse
 from pymongo import ReturnDocument
 from urllib.parse import quote
+from server.catalog import catalog_collection
 
 # Define the path to your .env file first
 root_dir = Path(__file__).resolve().parents[2] 
@@ -454,10 +455,11 @@ async def get_platform_stats(request: Request):
 
         # --- MOVIE COUNTS ---
         # 1. Get total number of movies
-        total_movies = movie_db.hybridRecommendation2.count_documents({})
+        catalog = movie_db[catalog_collection(movie_db)]
+        total_movies = catalog.count_documents({})
 
         # 2. Get number of new movies added in the last 30 days
-        new_movies = movie_db.hybridRecommendation2.count_documents(
+        new_movies = catalog.count_documents(
             {"createdAt": {"$gte": thirty_days_ago}}
         )
 
@@ -3,15 +3,37 @@ from typing import List
 from fastapi import APIRouter, Request, HTTPException, Body
 from fastapi.responses import JSONResponse
 from bson import ObjectId, errors
+from pymongo import UpdateOne
 from pydantic import BaseModel
 from typing import Optional, List, Union
 from fastapi import APIRouter, Request, HTTPException, Query
 from datetime import datetime
 import uuid
 import re
-import random
 from typing import List, Dict
 from collections import Counter
+from itertools import islice
+from server.catalog import (
+    get_catalog, get_catalog_collection, catalog_collection, bump_catalog_revision, clean_movie,
+    MOVIES_COLLECTION,
+)
+from server.streaming import stream_documents, STREAM_BATCH_SIZE
+from server.pagination import encode_cursor, decode_cursor, start_after
+from server.genre_index import GenreIndex
+from server.search_index import TrigramIndex, TitleAutocomplete
+from server.recommender import (
+    REGENERATE_SIZE, REGENERATE_SPREAD, movie_positions, materialize, GenreMatrix, genre_pool,
+)
+from server.hybrid_scorer import UserProfile, get_hybrid_scorer
+from server.neighbors import get_neighbors
+from server.content_index import get_content_index
+from server.result_cache import get_result_cache, LIKED, SAVED, HISTORY, RECOMMENDED
+from server.interactions import entry_id, add_update, remove_update
+from server.history_buffer import get_history_buffer, flush_history
+from server.genres import (
+    normalize_genres, genre_list, count_genres, apply_genre_counts,
+    read_genre_facet, rebuild_genre_facet, movie_ids_present, display_genre,
+)
 
 class Movie(BaseModel):
     _id: Optional[str]  # ObjectId as string
@@ -36,53 +58,159 @@ def to_objectid_safe(id_str):
 
 router = APIRouter()
 
+def _regex_matches(pattern, value) -> bool:
+    # Mirrors a Mongo $regex on a field that may hold a string or an array of strings
+    if isinstance(value, str):
+        return pattern.search(value) is not None
+    if isinstance(value, list):
+        return any(isinstance(v, str) and pattern.search(v) is not None for v in value)
+    return False
+
+# Fields returned for a movie in liked / saved / history lists
+MOVIE_CARD_FIELDS = (
+    "_id", "movieId", "poster_url", "title", "trailer_url", "trailer_key", "genres",
+    "tmdb_id", "overview", "director", "producers", "actors", "predicted_rating",
+)
+
+def _movie_card(snapshot, movie_id) -> Optional[Dict]:
+    # Catalog metadata for one movieId, joined from the in-memory snapshot
+    movie = snapshot.movie(movie_id)
+    if movie is None:
+        return None
+    return {k: movie[k] for k in MOVIE_CARD_FIELDS if k in movie}
+
+def _card_json(movie: Dict) -> Dict:
+    out = {k: v for k, v in movie.items() if k != "ts"}
+    if "_id" in out:
+        out["_id"] = str(out["_id"])
+    if out.get("movieId") is not None:
+        out["movieId"] = str(out["movieId"])
+    out["genres"] = genre_list(out.get("genres"))
+    rating = out.get("predicted_rating")
+    if isinstance(rating, float) and math.isnan(rating):
+        out["predicted_rating"] = None
+    return out
+
+def _stub_card(movie_id: str) -> Dict:
+    # known to neither the catalog nor the embedded entry: keep a placeholder
+    # so the list stays in step with /counts and the entry can still be removed
+    return {"movieId": movie_id, "title": f"Movie #{movie_id}", "poster_url": "", "genres": []}
+
+def _hydrate(request: Request, items) -> List[Dict]:
+    """Movie cards for stored interaction entries, in order, one per movieId.
+
+    Cards come from the in-memory catalog; ids it does not know yet (synced
+    after the snapshot was taken) are fetched in one $in query on the live
+    collection. Embedded copies (legacy objects, or the title / poster kept
+    for a movie missing from the catalog) are only used for movies the
+    catalog no longer has, and anything else gets a "Movie #id" placeholder.
+    """
+    snapshot = get_catalog(request)
+    ids, embedded = [], {}
+    for item in items or []:
+        mid = entry_id(item)
+        if not mid or mid in embedded or mid in ids:
+            continue
+        ids.append(mid)
+        if isinstance(item, dict) and set(item) - {"movieId", "ts"}:
+            embedded[mid] = item
+
+    cards = {mid: _movie_card(snapshot, mid) for mid in ids}
+    missing = [mid for mid, card in cards.items() if card is None]
+    if missing:
+        projection = {k: 1 for k in MOVIE_CARD_FIELDS}
+        for doc in get_catalog_collection(request).find({"movieId": {"$in": missing}}, projection):
+            if cards.get(str(doc.get("movieId"))) is None:
+                cards[str(doc.get("movieId"))] = doc
+
+    out = []
+    for mid in ids:
+        card = cards.get(mid) or embedded.get(mid)
+        out.append(_card_json(card) if card else _stub_card(mid))
+    return out
+
 @router.get("/all")
-def get_all_movies(request: Request):
-    db = request.app.state.movie_db
+def get_all_movies(request: Request, stream: Optional[str] = Query(None, pattern="^(ndjson|json)$")):
     try:
-        # Fetch from your actual collection
-        movies = list(db.hybridRecommendation2.find().limit(50000))
-
-        for movie in movies:
-            movie["_id"] = str(movie["_id"])
-
-            # Replace all NaN values with None
-            for key, value in movie.items():
-                if isinstance(value, float) and math.isnan(value):
-                    movie[key] = None
+        if stream:
+            # Chunked mode: serialize in batches so memory stays flat regardless of catalog size.
+            # Before the first snapshot load completes, read the cursor in batches instead.
+            snapshot = request.app.state.catalog.peek()
+            if snapshot is not None:
+                rows = islice(snapshot.movies, 50000)
+            else:
+                db = request.app.state.movie_db
+                cursor = db[catalog_collection(db)].find().limit(50000).batch_size(STREAM_BATCH_SIZE)
+                rows = (clean_movie(doc) for doc in cursor)
+            return stream_documents(rows, stream)
 
+        # Served from the in-process catalog snapshot (already cleaned of NaN / ObjectId)
+        movies = get_catalog(request).movies[:50000]
         return JSONResponse(content=movies)
     except Exception as e:
         print("❌ Failed to fetch movies:", e)
         raise HTTPException(status_code=500, detail="Failed to fetch movies")
 
 @router.get("/limit")
-def get_movies(request: Request, page: int = 1, limit: int = 20, search: str = ""):
-    db = request.app.state.movie_db
-    skip = (page - 1) * limit
-
-    query = {}
-    if search:
-        query = {
-            "$or": [
-                {"title": {"$regex": search, "$options": "i"}},
-                {"director": {"$regex": search, "$options": "i"}}
-            ]
-        }
-
+def get_movies(
+    request: Request,
+    page: int = 1,
+    limit: int = 20,
+    search: str = "",
+    after: Optional[str] = None,
+    withTotal: bool = True,
+):
+    # Keyset pagination: pass back `next` as `after` to fetch the following page.
+    # `page` still works for the admin table; both cost the same on any page.
     try:
-        cursor = db.hybridRecommendation2.find(query, {"_id": 1, "movieId": 1, "title": 1, "poster_url": 1, "director": 1})
-        total = db.hybridRecommendation2.count_documents(query)
-        movies = list(cursor.skip(skip).limit(limit))
+        snapshot = get_catalog(request)
+        positions = _limit_positions(snapshot, search)
+
+        if after:
+            try:
+                start = start_after(snapshot, positions, decode_cursor(after))
+            except ValueError:
+                raise HTTPException(status_code=400, detail="Invalid cursor")
+        else:
+            start = max(page - 1, 0) * limit
 
-        for movie in movies:
-            movie["_id"] = str(movie["_id"])
+        page_positions = positions[start:start + limit]
+        fields = ("_id", "movieId", "title", "poster_url", "director")
+        page_movies = [
+            {k: snapshot.movies[i][k] for k in fields if k in snapshot.movies[i]}
+            for i in page_positions
+        ]
 
-        return {"data": movies, "total": total, "page": page}
+        # a keyset page has no page number; clients follow `next` instead
+        response = {"data": page_movies, "next": None} if after else {"data": page_movies, "page": page, "next": None}
+        if page_positions and start + limit < len(positions):
+            response["next"] = encode_cursor(page_movies[-1]["_id"])
+        if withTotal:
+            response["total"] = len(positions)
+        return response
+    except HTTPException:
+        raise
     except Exception as e:
         print("❌ Error:", e)
         raise HTTPException(status_code=500, detail="Failed to fetch movies")
 
+def _limit_positions(snapshot, search: str) -> List[int]:
+    # Ascending snapshot row positions matching the admin search, cached per catalog version
+    if not search:
+        return snapshot.derived("all_positions", lambda snap: range(len(snap.movies)))
+
+    def build():
+        rows = TrigramIndex.for_snapshot(snapshot).search(search)
+        if rows is not None:
+            return rows
+        # `search` is an actual regex: evaluate it like the old $regex query
+        pattern = re.compile(search, re.IGNORECASE)
+        return [
+            i for i, m in enumerate(snapshot.movies)
+            if _regex_matches(pattern, m.get("title")) or _regex_matches(pattern, m.get("director"))
+        ]
+    return snapshot.memo("limit_search", search, build)
+
 # like
 @router.post("/like")
 async def add_to_liked_movies(request: Request):
@@ -90,7 +218,6 @@ async def add_to_liked_movies(request: Request):
     data = await request.json()
     db = request.app.state.movie_db
     liked_collection = db["liked"]
-    movies_collection = db["hybridRecommendation2"]
 
     user_id = data.get("userId")
     if not user_id:
@@ -114,7 +241,10 @@ async def add_to_liked_movies(request: Request):
         # handle string/int or accidental [id] array
         mid = _extract_id(raw_movie_id[0] if isinstance(raw_movie_id, list) and raw_movie_id else raw_movie_id)
         if mid:
-            movie = movies_collection.find_one({"$or": [{"movieId": mid}, {"_id": mid}]})
+            snapshot = get_catalog(request)
+            movie = snapshot.movie(mid)
+            if movie is None and snapshot.position_of(mid) is not None:
+                movie = snapshot.movies[snapshot.position_of(mid)]
 
     if not movie:
         raise HTTPException(status_code=404, detail="Movie not found or not provided")
@@ -130,23 +260,15 @@ async def add_to_liked_movies(request: Request):
         if full.get("_id"):
             full["movieId"] = full["_id"]
 
-    if isinstance(full.get("genres"), str):
-        full["genres"] = [s.strip() for s in full["genres"].split(",") if s.strip()]
-
     mid = str(full.get("movieId") or full.get("_id") or "")
     if not mid:
         raise HTTPException(status_code=422, detail="Movie lacks identifiable ID")
 
-    # 3) de-dupe by id, then push object
-    liked_collection.update_one(
-        {"userId": user_id},
-        {"$pull": {"likedMovies": {"$or": [{"movieId": mid}, {"_id": mid}]}}}
-    )
-    liked_collection.update_one(
-        {"userId": user_id},
-        {"$push": {"likedMovies": full}},
-        upsert=True
-    )
+    # 3) de-dupe by id and append the compact entry in one pipeline update; a movie
+    # the catalog does not have keeps the client's title / poster for its card
+    fallback = full if get_catalog(request).movie(mid) is None else None
+    liked_collection.update_one({"userId": user_id}, add_update("liked", mid, fallback=fallback), upsert=True)
+    get_result_cache(request).invalidate(user_id, LIKED)
 
     return {"message": "Movie added to liked list", "movieId": mid}
     
@@ -176,14 +298,12 @@ async def add_to_liked_movies(request: Request):
 def get_liked_movies(userId: str, request: Request):
     db = request.app.state.movie_db
     liked_collection = db["liked"]
-    movies_collection = db["hybridRecommendation2"]
 
-    liked_doc = liked_collection.find_one({"userId": userId})
+    liked_doc = liked_collection.find_one({"userId": userId}, {"likedMovies": 1})
     if not liked_doc or not liked_doc.get("likedMovies"):
         return {"likedMovies": []}
 
-    # The likedMovies are full movie objects already (your screenshot shows that)
-    return {"likedMovies": liked_doc["likedMovies"]}
+    return {"likedMovies": _hydrate(request, liked_doc["likedMovies"])}
 
 @router.post("/likedMovies/delete")
 async def remove_from_liked_movies(request: Request):
@@ -197,31 +317,11 @@ async def remove_from_liked_movies(request: Request):
     if not user_id or movie_id is None:
         raise HTTPException(status_code=400, detail="Missing userId or movieId")
 
-    mid = str(movie_id)  # normalize to string
-    int_mid = None
-    try:
-        int_mid = int(movie_id)
-    except (ValueError, TypeError):
-        pass
-
-    # remove scalar match
-    r1 = liked_collection.update_one(
-        {"userId": user_id},
-        {"$pull": {"likedMovies": {"$in": [mid] + ([int_mid] if int_mid is not None else [])}}}
-    )
-    # remove object match: { movieId: "<id>" }
-    r2 = liked_collection.update_one(
-        {"userId": user_id},
-        {"$pull": {"likedMovies": {"movieId": mid}}}
-    )
-    # remove object match: { _id: "<id>" }
-    r3 = liked_collection.update_one(
-        {"userId": user_id},
-        {"$pull": {"likedMovies": {"_id": mid}}}
-    )
-
-    modified = (r1.modified_count or 0) + (r2.modified_count or 0) + (r3.modified_count or 0)
-    print(f"💥 MongoDB modified counts: {r1.modified_count}, {r2.modified_count}, {r3.modified_count}")
+    # string, numeric, { movieId } and { _id } matches all go in one pipeline update
+    result = liked_collection.update_one({"userId": user_id}, remove_update("liked", str(movie_id)))
+    modified = result.modified_count or 0
+    print(f"💥 MongoDB modified count: {modified}")
+    get_result_cache(request).invalidate(user_id, LIKED)
 
     if modified > 0:
         return {"message": "Movie removed from liked list"}
@@ -234,7 +334,6 @@ async def add_to_history(request: Request):
     data = await request.json()
     db = request.app.state.movie_db
     history_collection = db["history"]
-    movies_collection = db["hybridRecommendation2"]
 
     user_id = data.get("userId")
     movie_obj = data.get("movie") or None
@@ -249,68 +348,18 @@ async def add_to_history(request: Request):
 
     movie_id = str(movie_id)
 
-    # normalize helper
-    def normalize_movie(m: dict) -> dict:
-        out = dict(m or {})
-        if "_id" in out:
-            out["_id"] = str(out["_id"])
-        # normalize genres to list[str]
-        g = out.get("genres")
-        if isinstance(g, str):
-            out["genres"] = [s.strip() for s in g.split("|") if s.strip()]
-        elif isinstance(g, list):
-            out["genres"] = [str(x).strip() for x in g if str(x).strip()]
-        # ensure a stable key exists
-        out["movieId"] = str(out.get("movieId") or out.get("_id") or movie_id)
-        return out
-
-    # If only ID was sent, hydrate a full object from movies_collection
-    if not movie_obj:
-        doc = movies_collection.find_one(
-            {"movieId": movie_id},
-            {
-                "_id": 1, "movieId": 1, "poster_url": 1, "title": 1,
-                "trailer_url": 1, "trailer_key": 1, "genres": 1,
-                "tmdb_id": 1, "overview": 1, "director": 1,
-                "producers": 1, "actors": 1
-            }
-        )
-        # If not found, still store a minimal object so history is usable offline
-        movie_obj = doc or {"movieId": movie_id, "title": f"Movie {movie_id}"}
-
-    movie_norm = normalize_movie(movie_obj)
-
     try:
-        # Remove any existing occurrence (by id or _id) so we can "move to end"
-        history_collection.update_one(
-            {"userId": user_id},
-            {"$pull": {
-                "historyObjects": {
-                    "$or": [
-                        {"movieId": movie_id},
-                        {"_id": movie_id}
-                    ]
-                },
-                # Optional: if you keep IDs for order/compatibility, pull them too
-                "historyMovies": movie_id
-            }},
-            upsert=True
-        )
-
-        # Always store the full object; optionally keep an ID list too
-        history_collection.update_one(
-            {"userId": user_id},
-            {
-                "$push": {
-                    "historyObjects": {"$each": [movie_norm], "$slice": -300},
-                    # Optional: keep a parallel ID list (handy for ordering/back-compat)
-                    "historyMovies": {"$each": [movie_id], "$slice": -1000}
-                }
-            },
-            upsert=True
-        )
+        # "Move to end" in one pipeline update: drop any earlier occurrence, append a
+        # compact {movieId, ts} entry (hydrated on read) and the id to the ordering list.
+        # With the write-behind buffer on, views are coalesced and written in batches.
+        buffer = get_history_buffer(request)
+        if buffer is not None:
+            buffer.add(user_id, movie_id)
+        else:
+            history_collection.update_one({"userId": user_id}, add_update("history", movie_id), upsert=True)
+        get_result_cache(request).invalidate(user_id, HISTORY)
 
-        return {"message": "Movie stored in history as object"}
+        return {"message": "Movie stored in history"}
     except Exception as e:
         print("❌ Error saving history:", e)
         raise HTTPException(status_code=500, detail="Failed to save history")
@@ -319,76 +368,38 @@ async def add_to_history(request: Request):
 def get_history_movies(userId: str, request: Request):
     db = request.app.state.movie_db
     history = db["history"]
-    movies = db["hybridRecommendation2"]
-
-    def norm(m: dict) -> dict:
-        out = dict(m)
-        if "_id" in out:
-            out["_id"] = str(out["_id"])
-        g = out.get("genres")
-        if isinstance(g, str):
-            out["genres"] = [s.strip() for s in g.split("|") if s.strip()]
-        elif isinstance(g, list):
-            out["genres"] = [str(x).strip() for x in g if str(x).strip()]
-        return out
-
-    # 1) Get the objects, but EXCLUDE the `historyMovies` array so it's never in memory here
+    flush_history(request, userId)
+
+    # 1) Get the entries, but EXCLUDE the `historyMovies` array so it's never in memory here
     doc = history.find_one({"userId": userId}, {"historyMovies": 0}) or {}
-    objs: list[dict] = doc.get("historyObjects") or []
+    objs: list = doc.get("historyObjects") or []
 
     # 2) Fetch ordering separately (only the array), but we won't return it
     order_doc = history.find_one({"userId": userId}, {"_id": 0, "historyMovies": 1}) or {}
     ids: list[str] = [str(x) for x in (order_doc.get("historyMovies") or [])]
 
-    # 3) Prefer objects; order them by the `historyMovies` id list if available
+    # 3) Prefer the entries; order them by the `historyMovies` id list if available
     if objs:
         bykey = {}
         for m in objs:
-            k = str(m.get("movieId") or m.get("_id") or "")
+            k = entry_id(m)
             if k:
                 bykey[k] = m
-
-        seen, out = set(), []
         if ids:
-            for mid in ids:
-                m = bykey.get(mid)
-                if m and mid not in seen:
-                    seen.add(mid)
-                    out.append(norm(m))
+            ordered = [bykey[mid] for mid in ids if mid in bykey]
             # append any extras not referenced by ids (rare)
-            for m in objs:
-                k = str(m.get("movieId") or m.get("_id") or "")
-                if k and k not in seen:
-                    seen.add(k)
-                    out.append(norm(m))
+            listed = set(ids)
+            ordered.extend(m for m in objs if entry_id(m) and entry_id(m) not in listed)
         else:
             # no ordering array → return as stored
-            for m in objs:
-                k = str(m.get("movieId") or m.get("_id") or "")
-                if k:
-                    out.append(norm(m))
+            ordered = objs
 
         # ✅ Response has NO `historyMovies` field from DB; just the list of movies
-        return {"historyMovies": out}
+        return {"historyMovies": _hydrate(request, ordered)}
 
     # 4) Fallback for legacy docs with only the id array (still not exposing it)
-    if not ids:
-        return {"historyMovies": []}
-
-    cursor = movies.find(
-        {"movieId": {"$in": ids}},
-        {
-            "_id": 1, "movieId": 1, "poster_url": 1, "title": 1,
-            "trailer_url": 1, "trailer_key": 1, "genres": 1,
-            "tmdb_id": 1, "overview": 1, "director": 1,
-            "producers": 1, "actors": 1
-        }
-    )
-    by_id = {str(d.get("movieId")): norm({**d, "_id": str(d["_id"])}) for d in cursor}
-    ordered = [by_id[i] for i in ids if i in by_id]
-
     # ✅ Still returning only the movie objects; internal array never leaves the server
-    return {"historyMovies": ordered}
+    return {"historyMovies": _hydrate(request, ids)}
 
 @router.post("/historyMovies/delete")
 async def remove_from_history(request: Request):
@@ -403,13 +414,9 @@ async def remove_from_history(request: Request):
 
     movie_id = str(movie_id)
 
-    result = history.update_one(
-        {"userId": user_id},
-        {"$pull": {
-            "historyMovies": movie_id,
-            "historyObjects": {"$or": [{"movieId": movie_id}, {"_id": movie_id}]},
-        }}
-    )
+    flush_history(request, user_id)
+    result = history.update_one({"userId": user_id}, remove_update("history", movie_id))
+    get_result_cache(request).invalidate(user_id, HISTORY)
     return {"message": "Movie removed from history" if result.modified_count else "Movie not found or already removed"}
 
 @router.post("/historyMovies/removeAllHistory")
@@ -422,11 +429,13 @@ async def remove_history(request: Request):
     if not user_id:
         raise HTTPException(status_code=400, detail="Missing userId")
 
+    flush_history(request, user_id)
     result = history.update_one(
         {"userId": user_id},
         {"$set": {"historyMovies": [], "historyObjects": []}},
         upsert=True,
     )
+    get_result_cache(request).invalidate(user_id, HISTORY)
     return {"message": "History cleared"}
 
 @router.post("/watchLater")
@@ -434,7 +443,6 @@ async def add_to_watchLater(request: Request):
     data = await request.json()
     db = request.app.state.movie_db
     watchLater_collection = db["saved"]
-    movies_collection = db["hybridRecommendation2"]
 
     user_id = data.get("userId")
     movie_id = str(data.get("movieId") or data.get("movie", {}).get("movieId") or "")
@@ -442,40 +450,9 @@ async def add_to_watchLater(request: Request):
     if not user_id or not movie_id:
         raise HTTPException(status_code=400, detail="Missing userId or movieId")
 
-    # inline projection (only fields the UI needs)
-    proj = {
-        "_id": 1, "movieId": 1, "poster_url": 1, "title": 1,
-        "trailer_url": 1, "trailer_key": 1, "genres": 1,
-        "tmdb_id": 1, "overview": 1, "director": 1,
-        "producers": 1, "actors": 1
-    }
-
-    movie = movies_collection.find_one({"movieId": movie_id}, proj)
-    if not movie:
-        movie = {"movieId": movie_id, "title": f"Movie #{movie_id}", "poster_url": ""}
-
-    # light normalize inline
-    movie = dict(movie)
-    if "_id" in movie:
-        movie["_id"] = str(movie["_id"])
-    if "movieId" in movie and movie["movieId"] is not None:
-        movie["movieId"] = str(movie["movieId"])
-    # (optional) normalize genres only if you need it:
-    g = movie.get("genres")
-    if isinstance(g, str):
-        movie["genres"] = [x.strip() for x in g.split("|") if x.strip()]
-
-    # avoid dupes by movieId: pull then add
-    watchLater_collection.update_one(
-        {"userId": user_id},
-        {"$pull": {"SaveMovies": {"movieId": movie_id}}},
-        upsert=True,
-    )
-    watchLater_collection.update_one(
-        {"userId": user_id},
-        {"$addToSet": {"SaveMovies": movie}},
-        upsert=True,
-    )
+    # avoid dupes by movieId: drop any earlier entry and append the compact one, in one update
+    watchLater_collection.update_one({"userId": user_id}, add_update("saved", movie_id), upsert=True)
+    get_result_cache(request).invalidate(user_id, SAVED)
 
     return {"message": "Movie saved to watch later"}
 
@@ -485,81 +462,14 @@ def get_watchLater_movies(userId: str, request: Request):
     try:
         db = request.app.state.movie_db
         watchLater_collection = db["saved"]
-        movies_collection = db["hybridRecommendation2"]
 
-        doc = watchLater_collection.find_one({"userId": userId}) or {}
+        doc = watchLater_collection.find_one({"userId": userId}, {"SaveMovies": 1}) or {}
         saved = doc.get("SaveMovies") or []
         if not saved:
             return {"SaveMovies": []}
 
-        full_objects = []
-        legacy_ids = []
-
-        for item in saved:
-            if isinstance(item, (str, int)):
-                legacy_ids.append(str(item))
-            elif isinstance(item, dict):
-                m = dict(item)
-                if "_id" in m:
-                    m["_id"] = str(m["_id"])
-                if "movieId" in m and m["movieId"] is not None:
-                    m["movieId"] = str(m["movieId"])
-                g = m.get("genres")
-                if isinstance(g, str):
-                    m["genres"] = [x.strip() for x in g.split("|") if x.strip()]
-                full_objects.append(m)
-
-        if legacy_ids:
-            proj = {
-                "_id": 1, "movieId": 1, "poster_url": 1, "title": 1,
-                "trailer_url": 1, "trailer_key": 1, "genres": 1,
-                "tmdb_id": 1, "overview": 1, "director": 1,
-                "producers": 1, "actors": 1
-            }
-            cursor = movies_collection.find({"movieId": {"$in": legacy_ids}}, proj)
-            found = []
-            for movie in cursor:
-                m = dict(movie)
-                if "_id" in m:
-                    m["_id"] = str(m["_id"])
-                if "movieId" in m and m["movieId"] is not None:
-                    m["movieId"] = str(m["movieId"])
-                g = m.get("genres")
-                if isinstance(g, str):
-                    m["genres"] = [x.strip() for x in g.split("|") if x.strip()]
-                found.append(m)
-            full_objects.extend(found)
-
-            # optional migration: replace scalar IDs with full docs
-            if found:
-                watchLater_collection.update_one(
-                    {"userId": userId},
-                    {"$pull": {"SaveMovies": {"$in": legacy_ids}}}
-                )
-                for m in found:
-                    mid = m.get("movieId")
-                    if not mid:
-                        continue
-                    watchLater_collection.update_one(
-                        {"userId": userId},
-                        {"$pull": {"SaveMovies": {"movieId": mid}}}
-                    )
-                    watchLater_collection.update_one(
-                        {"userId": userId},
-                        {"$addToSet": {"SaveMovies": m}},
-                        upsert=True
-                    )
-
-        # de-dupe by movieId
-        seen = set()
-        unique = []
-        for m in full_objects:
-            mid = m.get("movieId")
-            if mid and mid not in seen:
-                seen.add(mid)
-                unique.append(m)
-
-        return {"SaveMovies": unique}
+        # compact entries, legacy scalar ids and embedded objects alike, de-duped by movieId
+        return {"SaveMovies": _hydrate(request, saved)}
 
     except Exception as e:
         print("❌ Error fetching saved movies:", e)
@@ -577,65 +487,114 @@ async def remove_from_watchLater(request: Request):
     if not user_id or movie_id is None:
         raise HTTPException(status_code=400, detail="Missing userId or movieId")
 
-    mid = str(movie_id)
-    int_mid = None
-    try:
-        int_mid = int(movie_id)
-    except (ValueError, TypeError):
-        pass
+    result = watchLater_collection.update_one({"userId": user_id}, remove_update("saved", str(movie_id)))
+    print("💥 WatchLater delete modified count:", result.modified_count)
+    get_result_cache(request).invalidate(user_id, SAVED)
 
-    r1 = watchLater_collection.update_one(
-        {"userId": user_id},
-        {"$pull": {"SaveMovies": {"$in": [mid] + ([int_mid] if int_mid is not None else [])}}}
-    )
-    r2 = watchLater_collection.update_one(
-        {"userId": user_id},
-        {"$pull": {"SaveMovies": {"movieId": mid}}}
-    )
-
-    print("💥 WatchLater delete modified counts:", r1.modified_count, r2.modified_count)
-
-    if (r1.modified_count or 0) + (r2.modified_count or 0) > 0:
+    if result.modified_count:
         return {"message": "Movie removed from watch later list"}
     else:
         return {"message": "Movie not found or already removed"}
 
+# Bulk like / save / history events, e.g. replayed by a client after being offline
+MAX_BULK_EVENTS = 1000
+BULK_EVENT_TYPES = {"like": "liked", "save": "saved", "history": "history"}
+
+@router.post("/interactions/bulk")
+async def bulk_interactions(request: Request):
+    """Apply {userId, movieId, type: like|save|history, op: add|delete, ts?} events.
+
+    Each event is one pipeline update (the same ones the single endpoints
+    use), sent as one ordered bulk_write per collection so a user's events
+    apply in the order given.
+    """
+    body = await request.json()
+    events = body.get("events") if isinstance(body, dict) else None
+    if not isinstance(events, list) or not events:
+        raise HTTPException(status_code=400, detail="events must be a non-empty list")
+    if len(events) > MAX_BULK_EVENTS:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_BULK_EVENTS} events per request")
+
+    ops: Dict[str, list] = {name: [] for name in BULK_EVENT_TYPES.values()}
+    touched = set()
+    for i, event in enumerate(events):
+        if not isinstance(event, dict):
+            raise HTTPException(status_code=400, detail=f"events[{i}] must be an object")
+        user_id, movie_id = event.get("userId"), event.get("movieId")
+        name, op = BULK_EVENT_TYPES.get(event.get("type")), event.get("op", "add")
+        if not user_id or movie_id in (None, "") or name is None or op not in ("add", "delete"):
+            raise HTTPException(
+                status_code=400,
+                detail=f"events[{i}] needs userId, movieId, type in {sorted(BULK_EVENT_TYPES)} and op add|delete",
+            )
+        ts = None
+        if event.get("ts"):
+            try:
+                ts = datetime.fromisoformat(str(event["ts"]).replace("Z", "+00:00")).replace(tzinfo=None)
+            except ValueError:
+                raise HTTPException(status_code=400, detail=f"events[{i}].ts is not an ISO timestamp")
+
+        if op == "add":
+            ops[name].append(UpdateOne({"userId": user_id}, add_update(name, str(movie_id), ts), upsert=True))
+        else:
+            ops[name].append(UpdateOne({"userId": user_id}, remove_update(name, str(movie_id))))
+        touched.add((user_id, name))
+
+    db = request.app.state.movie_db
+    summary = {}
+    try:
+        # buffered views go first so the events below apply after them
+        for user_id, name in touched:
+            if name == "history":
+                flush_history(request, user_id)
+        for name, batch in ops.items():
+            if batch:
+                result = db[name].bulk_write(batch, ordered=True)
+                summary[name] = {
+                    "events": len(batch),
+                    "modified": result.modified_count,
+                    "upserted": result.upserted_count,
+                }
+    except Exception as e:
+        print("❌ Bulk interaction write failed:", e)
+        raise HTTPException(status_code=500, detail="Failed to apply interaction events")
+    finally:
+        cache = get_result_cache(request)
+        for user_id, name in touched:
+            cache.invalidate(user_id, name)
+
+    print(f"📦 Applied {len(events)} interaction events: {summary}")
+    return {"message": "Interaction events applied", "applied": len(events), "collections": summary}
+
 def _process_and_filter_movies(movie_list: List[Dict]) -> List[Dict]:
+    """Keep movies with a poster and trailer, one per title (highest predicted_rating).
 
+    Returns the records in title first-occurrence order. The lists passed
+    here are at most a few thousand rows, where a plain loop beats copying
+    the fields into arrays (see benchmarks/bench_process_movies.py).
+    """
     if not movie_list:
         return []
 
-    print(f"🚀 Processing a list of {len(movie_list)} movies...")
-
-    # Filter for valid URLs first
-    url_filtered_movies = [
-        movie for movie in movie_list
-        if movie.get("poster_url") and movie.get("trailer_url")
-    ]
-    print(f"🔗 URL filtering complete. {len(url_filtered_movies)} movies remain.")
-
     # Deduplicate by title, keeping the one with the highest rating
     deduplicated_movies: Dict[str, Dict] = {}
-    for movie in url_filtered_movies:
+    for movie in movie_list:
         title = movie.get("title")
-        if not title:
+        if not title or not movie.get("poster_url") or not movie.get("trailer_url"):
             continue
         try:
             current_rating = float(movie.get("predicted_rating", 0.0))
         except (ValueError, TypeError):
             current_rating = 0.0
-        
+
         if title not in deduplicated_movies or current_rating > float(deduplicated_movies[title].get("predicted_rating", 0.0)):
             movie["predicted_rating"] = current_rating
             deduplicated_movies[title] = movie
-            
-    unique_movies = list(deduplicated_movies.values())
-    print(f"👍 Deduplication complete. {len(unique_movies)} unique movies remain.")
 
+    unique_movies = list(deduplicated_movies.values())
     for movie in unique_movies:
         if isinstance(movie.get("_id"), ObjectId):
             movie["_id"] = str(movie["_id"])
-    
     return unique_movies
 
 # regenerate
@@ -656,19 +615,15 @@ def regenerate_movies(request: Request, body: dict = Body(...)):
     exclude_titles: List[str] = body.get("excludeTitles", [])
 
     try:
-        genre_pattern = "|".join(re.escape(g) for g in genres)
-        pipeline = [{"$match": {
-            "title": {"$nin": exclude_titles},
-            "poster_url": {"$ne": None, "$ne": ""},
-            "trailer_url": {"$ne": None, "$ne": ""},
-            "genres": {"$regex": genre_pattern, "$options": "i"}
-        }}]
-
-        movies_cursor = list(db.hybridRecommendation2.aggregate(pipeline))
-        
-        random.shuffle(movies_cursor)
-        processed_recommendations = _process_and_filter_movies(movies_cursor)
-        final_recommendations = processed_recommendations[:60]
+        # Hybrid blend of ALS / content / genre / popularity over the titles in the
+        # user's genres; each regenerate draws a fresh REGENERATE_SIZE from the
+        # user's best 3 x REGENERATE_SIZE
+        interacted = [mid for coll in INTERACTION_FIELDS for mid in _interaction_ids(request, user_id, coll)]
+        scorer = get_hybrid_scorer(request)
+        profile = UserProfile(user_id, genres, interacted, exclude_titles=exclude_titles,
+                              allowed=genre_pool(scorer.snapshot, genres))
+        positions = scorer.recommend([profile], REGENERATE_SIZE, spread=REGENERATE_SPREAD)[0]
+        final_recommendations = materialize(scorer.snapshot, positions)
 
         print(f"✅ Regenerated and filtered {len(final_recommendations)} movies. Saving to DB.")
         db.recommended.update_one(
@@ -676,6 +631,7 @@ def regenerate_movies(request: Request, body: dict = Body(...)):
             {"$set": {"recommended": final_recommendations}},
             upsert=True
         )
+        get_result_cache(request).invalidate(user_id, RECOMMENDED)
 
         # Remove internal MongoDB _id before sending to frontend
         for movie in final_recommendations:
@@ -693,20 +649,25 @@ def get_user_recommendations(userId: str, request: Request):
 
     db = request.app.state.movie_db
 
-    try:
+    def load():
         record = db.recommended.find_one({"userId": userId})
         
         # If no record is found, or the 'recommended' list is empty, return an empty list.
         if not record or not record.get("recommended"):
             print(f"No saved recommendations found for userId: {userId}")
-            return JSONResponse(content=[])
+            return []
 
         saved_recommendations = record.get("recommended", [])
         
         # Process the saved list using the helper function to ensure data quality.
         print(f"Found {len(saved_recommendations)} saved recommendations for userId: {userId}. Processing...")
-        filtered_recommendations = _process_and_filter_movies(saved_recommendations)
+        return _process_and_filter_movies(saved_recommendations)
 
+    try:
+        # cached until the saved list is rewritten (regenerate / store / delete) or the TTL runs out
+        filtered_recommendations = get_result_cache(request).get_or_compute(
+            userId, "recommendations", (RECOMMENDED,), load,
+        )
         return JSONResponse(content=filtered_recommendations)
 
     except Exception as e:
@@ -732,6 +693,7 @@ async def store_recommendations(
             { "$set": { "recommended": movies } },
             upsert=True
         )
+        get_result_cache(request).invalidate(user_id, RECOMMENDED)
         return { "message": "Recommendations saved to 'recommended' collection." }
     except Exception as e:
         print("❌ Error saving recommendations:", e)
@@ -751,6 +713,21 @@ def get_user_recommendations(userId: str, request: Request):
         print("❌ Error fetching recommendations:", e)
         raise HTTPException(status_code=500, detail="Failed to fetch recommendations")
 
+# Title suggestions for the search box: ids and titles only, answered in-process
+@router.get("/autocomplete")
+def autocomplete_titles(request: Request, q: str = Query(..., min_length=1), limit: int = Query(10, ge=1, le=50)):
+    try:
+        snapshot = get_catalog(request)
+        suggestions = snapshot.memo(
+            "autocomplete", (q.lower(), limit),
+            lambda: TitleAutocomplete.for_snapshot(snapshot).suggest(q, limit),
+            maxsize=1024,
+        )
+        return JSONResponse(content=suggestions)
+    except Exception as e:
+        print("❌ Autocomplete failed:", e)
+        raise HTTPException(status_code=500, detail="Autocomplete failed")
+
 # @router.get("/search")
 # def search_movies(request: Request, q: str = Query(..., min_length=1)):
 #     db = request.app.state.movie_db
@@ -775,37 +752,40 @@ def get_user_recommendations(userId: str, request: Request):
 #         raise HTTPException(status_code=500, detail="Search failed")
 
 # updated search
+SEARCH_PROJECTION = {
+    "_id": 1, "movieId": 1, "predicted_rating": 1, "title": 1, "genres": 1,
+    "tmdb_id": 1, "poster_url": 1, "trailer_url": 1, "trailer_key": 1,
+    "overview": 1, "director": 1, "producers": 1, "actors": 1,
+}
+
 @router.get("/search")
-def search_movies(request: Request, q: str = Query(..., min_length=1)):
-    db = request.app.state.movie_db
+def search_movies(
+    request: Request,
+    q: str = Query(..., min_length=1),
+    page: int = Query(1, ge=1),
+    limit: int = Query(60, ge=1, le=100),
+):
     try:
-        results = db.hybridRecommendation2.find({
-            "$text": { "$search": f"\"{q}\"" },
-            "poster_url": { "$nin": ["", None, "nan", "NaN"] },
-            "trailer_url": { "$nin": ["", None, "nan", "NaN"] }
-        })
-
-        seen_movie_ids = set()
-        unique_movies = []
-
-        for movie in results:
-            # Convert ObjectId to str
-            movie["_id"] = str(movie["_id"])
-
-            if "createdAt" in movie and isinstance(movie["createdAt"], datetime):
-                movie["createdAt"] = movie["createdAt"].isoformat()
-
-            # Fix NaN floats
-            for key, value in movie.items():
-                if isinstance(value, float) and math.isnan(value):
-                    movie[key] = None
-            
-            # Assume 'movieId' is the unique field to check duplicates
-            movie_id = movie.get("movieId")
-            if movie_id and movie_id not in seen_movie_ids:
-                seen_movie_ids.add(movie_id)
-                unique_movies.append(movie)
+        # Dedup by movieId, relevance ordering and paging all happen in the database,
+        # so the response is bounded no matter how common the search word is.
+        pipeline = [
+            {"$match": {
+                "$text": { "$search": f"\"{q}\"" },
+                "movieId": { "$nin": ["", None] },
+                "poster_url": { "$nin": ["", None, "nan", "NaN"] },
+                "trailer_url": { "$nin": ["", None, "nan", "NaN"] }
+            }},
+            {"$project": {**SEARCH_PROJECTION, "_score": {"$meta": "textScore"}}},
+            {"$sort": {"_score": -1}},
+            {"$group": {"_id": "$movieId", "doc": {"$first": "$$ROOT"}}},
+            {"$replaceRoot": {"newRoot": "$doc"}},
+            {"$sort": {"_score": -1, "movieId": 1}},
+            {"$skip": (page - 1) * limit},
+            {"$limit": limit},
+            {"$project": {"_score": 0}},
+        ]
 
+        unique_movies = [clean_movie(movie) for movie in get_catalog_collection(request).aggregate(pipeline)]
         return JSONResponse(content=unique_movies)
 
     except Exception as e:
@@ -824,10 +804,12 @@ async def remove_history(request: Request):
         raise HTTPException(status_code=400, detail="Missing userId")
 
     try:
+        flush_history(request, user_id)
         result = history_collection.update_one(
             {"userId": user_id},
             {"$set": {"historyMovies": []}}
         )
+        get_result_cache(request).invalidate(user_id, HISTORY)
 
         print("🧹 Cleared history count:", result.modified_count)
 
@@ -856,6 +838,7 @@ async def remove_from_recommended(request: Request):
     )
 
     print("🗑️ Removed from recommendations:", result.modified_count)
+    get_result_cache(request).invalidate(user_id, RECOMMENDED)
 
     if result.modified_count > 0:
         return {"message": "Movie removed from recommendations"}
@@ -867,7 +850,7 @@ async def remove_from_recommended(request: Request):
 async def delete_video(request: Request):
     data = await request.json()
     db = request.app.state.movie_db
-    movie_collection = db["hybridRecommendation2"]
+    movie_collection = get_catalog_collection(request)
 
     movie_id = data.get("movieId")
     print("🔍 Incoming movieId for deletion:", movie_id)
@@ -876,17 +859,29 @@ async def delete_video(request: Request):
         raise HTTPException(status_code=400, detail="Missing movieId")
 
     # Double check data type
-    result = movie_collection.delete_one({"movieId": str(movie_id)})
-
-    print("🗑️ Video deleted:", result.deleted_count)
-
-    if result.deleted_count > 0:
+    deleted = movie_collection.find_one_and_delete({"movieId": str(movie_id)}, projection={"genres": 1})
+
+    print("🗑️ Video deleted:", 1 if deleted else 0)
+
+    if deleted:
+        # the facet counts movies, so only the movie's last row takes it out
+        if not movie_ids_present(movie_collection, [movie_id]):
+            genre_delta = Counter()
+            genre_delta.subtract(count_genres([deleted]))
+            apply_genre_counts(db, genre_delta)
+        # serve the next request without the movie; other workers notice the new revision
+        request.app.state.catalog.drop_row(deleted["_id"], bump_catalog_revision(db))
+        content_index = get_content_index(request)
+        if content_index is not None:
+            content_index.remove([str(movie_id)])
         return {"message": "Movie deleted!"}
     else:
         return {"message": "Movie not found!"}
 
 
 # new for the because you like/save/watch
+ALS_RESULT_SIZE = 12
+
 @router.post("/als-liked")
 async def als_liked(request: Request):
     body = await request.json()
@@ -902,85 +897,38 @@ async def als_watched(request: Request):
     body = await request.json()
     return _als_filtered(body["userId"], "history", request, set(body.get("excludeIds", [])))
 
-# In your Python router file
+# collection -> array field holding the user's movies (ids or movie objects)
+INTERACTION_FIELDS = {"liked": "likedMovies", "saved": "SaveMovies", "history": "historyMovies"}
+
+def _interaction_ids(request: Request, userId: str, interaction_collection: str) -> List[str]:
+    field = INTERACTION_FIELDS.get(interaction_collection)
+    if not field:
+        return []
+    if interaction_collection == "history":
+        flush_history(request, userId)
+    doc = request.app.state.movie_db[interaction_collection].find_one({"userId": userId}, {field: 1}) or {}
+    return [str(mid.get("movieId") if isinstance(mid, dict) else mid) for mid in doc.get(field, [])]
 
 def _als_filtered(userId: str, interaction_collection: str, request: Request, exclude_ids=None):
-    # ... (the top part of the function is correct and remains the same)
-    db = request.app.state.movie_db
-    als = db["alsRecommendations"]
-    movies = db["hybridRecommendation2"]
-    interactions = db[interaction_collection]
+    exclude_ids = {str(mid) for mid in (exclude_ids or ())}
 
-    try:
-        interaction_doc = interactions.find_one({"userId": userId})
-        if not interaction_doc: return JSONResponse(content=[])
-        interaction_map = { "liked": "likedMovies", "saved": "SaveMovies", "history": "historyMovies" }
-        interaction_key = interaction_map.get(interaction_collection)
-        if not interaction_key: return JSONResponse(content=[])
-        interaction_ids = [str(mid.get("movieId") if isinstance(mid, dict) else mid)
-                           for mid in interaction_doc.get(interaction_key, [])]
-        if not interaction_ids: return JSONResponse(content=[])
-
-        final_movies = []
-        
-        # --- Primary Method: Try to find ALS recommendations first ---
-        als_results = list(als.find({"userId": userId}).sort("rating", -1))
+    def compute():
+        interaction_ids = _interaction_ids(request, userId, interaction_collection)
+        if not interaction_ids: return []
 
-        if als_results:
-            pass
+        # ALS, content and genre signals from the interacted movies, blended
+        # with popularity over the whole title pool in one scoring call
+        profile = UserProfile(userId, interacted=interaction_ids, exclude_ids=sorted(exclude_ids))
+        positions = scorer.top([profile], ALS_RESULT_SIZE)[0]
+        return materialize(scorer.snapshot, positions)
 
-        # --- Fallback Logic: Runs if primary method yields no results ---
-        if not final_movies:
-            print(f"⚠️ No ALS recommendations for {userId}. Initiating genre similarity fallback.")
-            
-            interacted_movies_cursor = list(movies.find({"movieId": {"$in": interaction_ids}}, {"genres": 1}))
-            if not interacted_movies_cursor: return JSONResponse(content=[])
-            
-            user_genre_set = set()
-            for movie in interacted_movies_cursor:
-                raw_genres = movie.get("genres", [])
-                if isinstance(raw_genres, str):
-                    user_genre_set.update(g.strip().lower() for g in raw_genres.split("|"))
-                elif isinstance(raw_genres, list):
-                    user_genre_set.update(g.strip().lower() for g in raw_genres)
-
-            if not user_genre_set: return JSONResponse(content=[])
-            print(f"User's taste profile (genres): {list(user_genre_set)}")
-
-            all_exclude_ids = set(interaction_ids) | exclude_ids
-            candidate_cursor = movies.find({
-                "movieId": {"$nin": list(all_exclude_ids)},
-                "poster_url": {"$ne": None, "$ne": ""},
-                "trailer_url": {"$ne": None, "$ne": ""}
-            }).limit(1000)
-
-            scored_candidates = []
-            for movie in candidate_cursor:
-                raw_movie_genres = movie.get("genres", [])
-                movie_genre_set = set()
-                if isinstance(raw_movie_genres, str):
-                    movie_genre_set = set(g.strip().lower() for g in raw_movie_genres.split("|"))
-                elif isinstance(raw_movie_genres, list):
-                    movie_genre_set = set(g.strip().lower() for g in raw_movie_genres)
-                
-                intersection = len(user_genre_set.intersection(movie_genre_set))
-                
-                if intersection > 0:
-                    # The score is now simply the number of shared genres.
-                    movie['similarity_score'] = intersection
-                    scored_candidates.append(movie)
-            
-            # Sort the candidates by the number of shared genres (most shared first).
-            final_movies = sorted(scored_candidates, key=lambda x: x['similarity_score'], reverse=True)
-            print(f"Fallback found {len(final_movies)} relevant movies with at least one shared genre.")
-        
-        # --- Final Processing ---
-        if not final_movies:
-            return JSONResponse(content=[])
-
-        processed_movies = _process_and_filter_movies(final_movies)
-        
-        return JSONResponse(content=processed_movies[:12])
+    try:
+        # cached per interaction list and catalog version; the list's write endpoints invalidate it
+        scorer = get_hybrid_scorer(request)
+        key = ("als", interaction_collection, scorer.snapshot.version, tuple(sorted(exclude_ids)))
+        return JSONResponse(content=get_result_cache(request).get_or_compute(
+            userId, key, (interaction_collection,), compute,
+        ))
 
     except Exception as e:
         import traceback
@@ -989,6 +937,71 @@ def _als_filtered(userId: str, interaction_collection: str, request: Request, ex
         raise HTTPException(status_code=500, detail="Internal server error")
 
 
+@router.get("/result-cache/stats")
+def result_cache_stats(request: Request):
+    return JSONResponse(content=get_result_cache(request).stats())
+
+
+@router.get("/history-buffer/stats")
+def history_buffer_stats(request: Request):
+    buffer = get_history_buffer(request)
+    return JSONResponse(content=buffer.stats() if buffer is not None else {"enabled": False})
+
+
+# co-occurrence neighbours ("people who liked X also liked")
+def _neighbor_movies(request: Request, ranked) -> List[Dict]:
+    snapshot = get_catalog(request)
+    positions = movie_positions(snapshot)
+    return materialize(snapshot, [positions[mid] for mid, _ in ranked if mid in positions])
+
+@router.get("/neighbors/{movieId}")
+def get_movie_neighbors(movieId: str, request: Request, limit: int = Query(12, ge=1, le=50)):
+    index = get_neighbors(request)
+    if index is None:
+        return JSONResponse(content=[])
+    # over-fetch a little: some neighbours may not be playable in the catalog
+    ranked = index.similar(movieId, k=limit * 2)
+    return JSONResponse(content=_neighbor_movies(request, ranked)[:limit])
+
+@router.get("/similar/{movieId}")
+def get_similar_movies(movieId: str, request: Request, limit: int = Query(12, ge=1, le=50)):
+    # Content-based: overview / director / actors / producers (see server.content_index)
+    snapshot = get_catalog(request)
+    movie = snapshot.movie(movieId)
+    if movie is None:
+        raise HTTPException(status_code=404, detail="Movie not found")
+
+    index = get_content_index(request)
+    ranked = index.similar(movie, k=limit * 2) if index is not None else []
+    positions = movie_positions(snapshot)
+    hits = [positions[mid] for mid, _ in ranked if mid in positions]
+    if not hits:
+        # no index yet, or nothing in common: fall back to shared genres
+        hits = GenreMatrix.for_snapshot(snapshot).top(genre_list(movie.get("genres")), {str(movieId)}, limit)
+    return JSONResponse(content=materialize(snapshot, hits[:limit]))
+
+@router.post("/because-you-liked")
+async def because_you_liked(request: Request):
+    body = await request.json()
+    user_id = body.get("userId")
+    source = body.get("source", "liked")
+    if not user_id:
+        raise HTTPException(status_code=400, detail="userId is required")
+    if source not in INTERACTION_FIELDS:
+        raise HTTPException(status_code=400, detail=f"source must be one of {sorted(INTERACTION_FIELDS)}")
+    try:
+        limit = min(max(int(body.get("limit", 12)), 1), 50)
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="limit must be an integer")
+
+    index = get_neighbors(request)
+    if index is None:
+        return JSONResponse(content=[])
+    seeds = _interaction_ids(request, user_id, source)
+    ranked = index.because(seeds, k=limit * 2, exclude=body.get("excludeIds", []))
+    return JSONResponse(content=_neighbor_movies(request, ranked)[:limit])
+
+
 # GET /api/movies/counts/:userId
 @router.get("/counts/{userId}")
 def get_user_counts(userId: str, request: Request):
@@ -998,6 +1011,7 @@ def get_user_counts(userId: str, request: Request):
 
         liked_doc = db["liked"].find_one({"userId": userId})
         saved_doc = db["saved"].find_one({"userId": userId})
+        flush_history(request, userId)
         watched_doc = db["history"].find_one({"userId": userId})
 
         liked_count = len(liked_doc.get("likedMovies", [])) if liked_doc else 0
@@ -1067,7 +1081,11 @@ async def get_top_liked_movies(request: Request):
         # Fetch all movies that are liked, sort by likeCount, then by movieId (for stability)
         pipeline = [
             { "$unwind": "$likedMovies" },
-            { "$group": { "_id": "$likedMovies", "likeCount": { "$sum": 1 } } },
+            # entries are {movieId, ts} (or legacy objects / bare ids): count per movie
+            { "$group": {
+                "_id": { "$toString": { "$ifNull": ["$likedMovies.movieId", "$likedMovies"] } },
+                "likeCount": { "$sum": 1 },
+            } },
             { "$sort": { "likeCount": -1, "_id": 1 } },
             { "$limit": 10 }
         ]
@@ -1075,11 +1093,13 @@ async def get_top_liked_movies(request: Request):
 
         movie_ids = [m["_id"] for m in liked_result]
 
-        # Step 2: Filter out deleted movies
-        movie_docs = list(db["hybridRecommendation2"].find({ "movieId": { "$in": movie_ids } }))
-
-        # Create a dictionary with valid movies
-        movie_dict = {str(movie["movieId"]): movie for movie in movie_docs}
+        # Step 2: Filter out deleted movies (joined from the in-memory catalog)
+        snapshot = get_catalog(request)
+        movie_dict = {}
+        for movie_id in movie_ids:
+            movie = snapshot.movie(movie_id)
+            if movie is not None:
+                movie_dict[str(movie_id)] = dict(movie)
 
         response = []
         for movie in liked_result:
@@ -1106,11 +1126,24 @@ async def get_top_liked_movies(request: Request):
         raise HTTPException(status_code=500, detail=str(e))
 
 # Move movies from 'added' collection to 'hybridRecommendation2', replace existing movies with the same title.    
+def _sync_conflicts(collection, movies: List[Dict], titles: List[str]) -> List[str]:
+    """movieIds the split layout's unique movieId index would reject.
+
+    A movie whose title is being replaced is deleted before the insert, so
+    only ids still held by other titles (or repeated in the batch) clash.
+    """
+    ids = [str(m.get("movieId") or "") for m in movies]
+    conflicts = {"(missing movieId)"} if "" in ids else set()
+    conflicts.update(mid for mid, n in Counter(ids).items() if mid and n > 1)
+    taken = collection.find({"movieId": {"$in": [mid for mid in ids if mid]}, "title": {"$nin": titles}}, {"movieId": 1})
+    conflicts.update(str(doc["movieId"]) for doc in taken)
+    return sorted(conflicts)
+
 @router.post("/sync-added-movies")
 async def sync_added_movies(request: Request):
     db = request.app.state.movie_db
     added_collection = db["added"]
-    hybrid_collection = db["hybridRecommendation2"]
+    hybrid_collection = get_catalog_collection(request)
     sync_metadata_collection = db["sync_metadata"] # Collection to store sync metadata
 
     try:
@@ -1119,6 +1152,20 @@ async def sync_added_movies(request: Request):
         if not new_movies_from_added:
             return {"message": "No new movies found.", "newly_added_movies": []}
 
+        new_movie_titles = [movie.get("title") for movie in new_movies_from_added if movie.get("title")]
+
+        # The split layout keeps movieId unique: check before anything is written,
+        # so a clash cannot leave the catalog half-synced
+        if hybrid_collection.name == MOVIES_COLLECTION:
+            conflicts = _sync_conflicts(hybrid_collection, new_movies_from_added, new_movie_titles)
+            if conflicts:
+                raise HTTPException(
+                    status_code=409,
+                    detail=f"movieId already used by another movie or repeated in the batch: {', '.join(conflicts[:20])}",
+                )
+            for movie in new_movies_from_added:
+                movie["movieId"] = str(movie["movieId"])
+
         # Generate a unique batch ID for this sync operation
         current_batch_id = str(uuid.uuid4()) # Generate a UUID for the batch
 
@@ -1128,24 +1175,25 @@ async def sync_added_movies(request: Request):
             {"lastSyncedBatchId": {"$ne": None}}, # Find documents that have a batch ID
             {"$unset": {"lastSyncedBatchId": ""}} # Remove the field
         )
-        print("🧹 Cleared lastSyncedBatchId from previous batches in hybridRecommendation2.")
+        print(f"🧹 Cleared lastSyncedBatchId from previous batches in {hybrid_collection.name}.")
 
 
-        new_movie_titles = [movie.get("title") for movie in new_movies_from_added if movie.get("title")]
-
         deleted_count = 0
+        genre_delta = Counter()
         if new_movie_titles:
+            replaced = list(hybrid_collection.find({"title": {"$in": new_movie_titles}}, {"genres": 1, "movieId": 1, "_id": 0}))
             delete_result = hybrid_collection.delete_many(
                 {"title": {"$in": new_movie_titles}}
             )
             deleted_count = delete_result.deleted_count
+            left = movie_ids_present(hybrid_collection, (m.get("movieId") for m in replaced))
+            genre_delta.subtract(count_genres(m for m in replaced if str(m.get("movieId")) not in left))
             print(f"🗑️ Deleted {deleted_count} existing movies matching new titles.")
 
         movies_to_insert = []
         for movie in new_movies_from_added:
             movie.pop("_id", None) 
-            if isinstance(movie.get("genres"), str):
-                movie["genres"] = [g.strip() for g in movie["genres"].split(',') if g.strip()]
+            movie["genres"] = normalize_genres(movie.get("genres"))
             
             movie["createdAt"] = datetime.utcnow() 
             movie["lastSyncedBatchId"] = current_batch_id # Add the current batch ID to new movies
@@ -1153,9 +1201,23 @@ async def sync_added_movies(request: Request):
 
         inserted_ids = []
         if movies_to_insert:
+            # movies that already have rows are counted in the facet
+            held = movie_ids_present(hybrid_collection, (m.get("movieId") for m in movies_to_insert))
+            new_to_facet = [m for m in movies_to_insert if str(m.get("movieId")) not in held]
             insert_result = hybrid_collection.insert_many(movies_to_insert)
             inserted_ids = insert_result.inserted_ids
             print(f"➕ Inserted {len(inserted_ids)} new movies.")
+            genre_delta.update(count_genres(new_to_facet))
+
+        # Incremental update of the content-based /similar index
+        content_index = get_content_index(request)
+        if content_index is not None:
+            if deleted_count:
+                content_index.remove(str(m["movieId"]) for m in replaced if m.get("movieId") is not None)
+            content_index.upsert(movies_to_insert)
+
+        # Keep the materialized /all-genres facet in step with the catalog
+        apply_genre_counts(db, genre_delta)
 
         # Store the current_batch_id as the latest successful sync ID
         sync_metadata_collection.update_one(
@@ -1164,6 +1226,7 @@ async def sync_added_movies(request: Request):
             upsert=True
         )
         print(f"📝 Updated latest sync batch ID to: {current_batch_id}")
+        request.app.state.catalog.refresh_async()
 
 
         newly_added_movies_details = []
@@ -1199,6 +1262,8 @@ async def sync_added_movies(request: Request):
             "newly_added_movies": newly_added_movies_details
         }
 
+    except HTTPException:
+        raise
     except Exception as e:
         print(f"❌ Error syncing movies: {e}")
         raise HTTPException(status_code=500, detail=f"Failed to sync movies: {e}")
@@ -1236,7 +1301,7 @@ def get_recently_added_persistent_movies(request: Request, batch_id: Optional[st
         # Now, query using the determined batch_id
         query = {"lastSyncedBatchId": batch_id}
 
-        movies_cursor = db.hybridRecommendation2.find(
+        movies_cursor = get_catalog_collection(request).find(
             query, 
             {"_id": 1, "movieId": 1, "title": 1, "poster_url": 1, "createdAt": 1, "lastSyncedBatchId": 1} 
         ).sort("createdAt", -1) # Sort by createdAt within the batch
@@ -1256,39 +1321,36 @@ def get_recently_added_persistent_movies(request: Request, batch_id: Optional[st
 
 
 @router.get("/all-genres")
-async def get_all_genres(request: Request):
+async def get_all_genres(request: Request, withCounts: bool = False):
     db = request.app.state.movie_db
     try:
-        all_movies = db["hybridRecommendation2"].find({}, {"genres": 1, "_id": 0})
-        genre_set = set()
-        for movie in all_movies:
-            if isinstance(movie.get("genres"), str):
-                genre_set.update(g.strip() for g in movie["genres"].split("|"))
-
-        return sorted(list(genre_set))
+        # Single point read of the facet maintained by /sync-added-movies and /delete
+        counts = read_genre_facet(db)
+        if counts is None:
+            counts = {g: n for g, n in rebuild_genre_facet(db, get_catalog(request).collection).items() if n > 0}
+
+        names = {g: display_genre(g) for g in counts}
+        ordered = sorted(counts, key=names.get)
+        if withCounts:
+            return [{"genre": names[g], "count": counts[g]} for g in ordered]
+        return [names[g] for g in ordered]
     except Exception as e:
         raise HTTPException(status_code=500, detail="Failed to load genres")
     
 @router.get("/byGenres")
 async def get_movies_by_genres(genres: str, request: Request):
-    db = request.app.state.movie_db
-    collection = db["hybridRecommendation2"]
-    
     genre_list = [g.strip() for g in genres.split(",")]
 
     try:
-
-        result = list(collection.find({
-            "$or": [
-                {"genres": {"$regex": genre, "$options": "i"}} for genre in genre_list
-            ]
-        }).limit(100))  # ✅ Add limit here
+        snapshot = get_catalog(request)
+        index = GenreIndex.for_snapshot(snapshot)
+        matched = index.match_any(genre_list)
 
         # Remove MongoDB _id field for frontend
-        for movie in result:
-            movie.pop("_id", None)
-
-        return result
+        return [
+            {k: v for k, v in snapshot.movies[i].items() if k != "_id"}
+            for i in index.positions(matched, limit=100)  # ✅ Add limit here
+        ]
 
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error fetching movies by genres: {str(e)}")
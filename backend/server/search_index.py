@@ -0,0 +1,175 @@
+import heapq
+import re
+from bisect import bisect_left
+from typing import Dict, List, Optional, Set
+
+from server.catalog import CatalogSnapshot
+
+# Characters that make `search` a real regex rather than a plain substring
+_REGEX_META = re.compile(r"[.^$*+?{}\[\]\\|()]")
+
+
+def normalize_text(value) -> str:
+    return value.lower() if isinstance(value, str) else ""
+
+
+def _trigrams(text: str) -> Set[str]:
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+class TrigramIndex:
+    """Trigram substring index over normalized catalog titles and directors.
+
+    Distinct normalized strings are indexed once (hybridRecommendation2
+    repeats each title per prediction row), and each string keeps the
+    ascending catalog rows it appears on. A case-insensitive substring
+    query intersects the posting lists of its trigrams, verifies the few
+    surviving strings with `in`, and returns the matching row positions.
+    """
+
+    FIELDS = ("title", "director")
+
+    def __init__(self, movies: List[Dict]):
+        self._strings: List[str] = []
+        self._rows: List[List[int]] = []
+        string_id: Dict[str, int] = {}
+        for row, movie in enumerate(movies):
+            seen_here = set()
+            for field in self.FIELDS:
+                text = normalize_text(movie.get(field))
+                if not text or text in seen_here:
+                    continue
+                seen_here.add(text)
+                sid = string_id.get(text)
+                if sid is None:
+                    sid = string_id[text] = len(self._strings)
+                    self._strings.append(text)
+                    self._rows.append([])
+                self._rows[sid].append(row)
+
+        self._postings: Dict[str, List[int]] = {}
+        for sid, text in enumerate(self._strings):
+            for gram in _trigrams(text):
+                self._postings.setdefault(gram, []).append(sid)
+
+    @classmethod
+    def for_snapshot(cls, snapshot: CatalogSnapshot) -> "TrigramIndex":
+        return snapshot.derived("trigram_index", lambda snap: cls(snap.movies))
+
+    def _string_ids(self, needle: str) -> List[int]:
+        if len(needle) < 3:
+            # Too short for a trigram; the distinct-string table is still small
+            return [sid for sid, text in enumerate(self._strings) if needle in text]
+
+        lists = []
+        for gram in _trigrams(needle):
+            posting = self._postings.get(gram)
+            if not posting:
+                return []
+            lists.append(posting)
+        lists.sort(key=len)
+        candidates = set(lists[0])
+        for posting in lists[1:]:
+            candidates.intersection_update(posting)
+            if not candidates:
+                return []
+        return [sid for sid in candidates if needle in self._strings[sid]]
+
+    def search(self, query: str) -> Optional[List[int]]:
+        """Ascending catalog rows whose title or director contains `query`.
+
+        Returns None when `query` uses regex syntax, so the caller can fall
+        back to evaluating the regex itself.
+        """
+        if _REGEX_META.search(query):
+            return None
+        rows: Set[int] = set()
+        for sid in self._string_ids(normalize_text(query)):
+            rows.update(self._rows[sid])
+        return sorted(rows)
+
+
+def normalize_title(value) -> str:
+    return " ".join(normalize_text(value).split())
+
+
+class TitleAutocomplete:
+    """Prefix lookup over normalized titles using a sorted key array.
+
+    Every word-start suffix of a title is a key ("the matrix" is found by
+    "the m" and by "matr"). A prefix maps to one contiguous key range via
+    two bisects; the range is ranked by popularity (number of catalog rows,
+    i.e. how many users the title was predicted for) and then by the best
+    predicted_rating.
+    """
+
+    # Ranges wider than this are answered by walking titles in global rank order
+    _SCAN_THRESHOLD = 256
+
+    def __init__(self, movies: List[Dict]):
+        by_title: Dict[str, Dict] = {}
+        for movie in movies:
+            key = normalize_title(movie.get("title"))
+            if not key:
+                continue
+            entry = by_title.get(key)
+            rating = movie.get("predicted_rating")
+            rating = float(rating) if isinstance(rating, (int, float)) else float("-inf")
+            if entry is None:
+                by_title[key] = {"movieId": movie.get("movieId"), "title": movie.get("title"),
+                                 "rating": rating, "popularity": 1}
+            else:
+                entry["popularity"] += 1
+                if rating > entry["rating"]:
+                    entry.update(movieId=movie.get("movieId"), title=movie.get("title"), rating=rating)
+
+        self._entries = list(by_title.values())
+        self._rank = [(e["popularity"], e["rating"]) for e in self._entries]
+
+        keyed = []
+        for eid, norm in enumerate(by_title):
+            words = norm.split(" ")
+            for w in range(len(words)):
+                keyed.append((" ".join(words[w:]), eid))
+        keyed.sort()
+        self._keys = [k for k, _ in keyed]
+        self._key_entry = [eid for _, eid in keyed]
+
+        # entry ids in descending rank, and each entry's key positions, for wide ranges
+        self._by_rank = sorted(range(len(self._entries)), key=lambda eid: self._rank[eid], reverse=True)
+        self._key_positions: Dict[int, List[int]] = {}
+        for pos, eid in enumerate(self._key_entry):
+            self._key_positions.setdefault(eid, []).append(pos)
+
+    @classmethod
+    def for_snapshot(cls, snapshot: CatalogSnapshot) -> "TitleAutocomplete":
+        return snapshot.derived("title_autocomplete", lambda snap: cls(snap.movies))
+
+    def suggest(self, prefix: str, k: int = 10) -> List[Dict]:
+        prefix = normalize_title(prefix)
+        if not prefix:
+            return []
+        lo = bisect_left(self._keys, prefix)
+        hi = bisect_left(self._keys, prefix + "\U0010ffff", lo)
+        if lo >= hi:
+            return []
+
+        if hi - lo <= self._SCAN_THRESHOLD:
+            eids = set(self._key_entry[lo:hi])
+            top = heapq.nlargest(k, eids, key=lambda eid: self._rank[eid])
+        else:
+            top = []
+            for eid in self._by_rank:
+                if any(lo <= pos < hi for pos in self._key_positions[eid]):
+                    top.append(eid)
+                    if len(top) >= k:
+                        break
+
+        return [
+            {
+                "movieId": self._entries[eid]["movieId"],
+                "title": self._entries[eid]["title"],
+                "predicted_rating": self._entries[eid]["rating"] if self._entries[eid]["rating"] != float("-inf") else None,
+            }
+            for eid in top
+        ]
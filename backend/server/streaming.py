@@ -0,0 +1,39 @@
+import json
+from itertools import islice
+from typing import Any, Dict, Iterable, Iterator
+
+from fastapi.responses import StreamingResponse
+
+STREAM_BATCH_SIZE = 500
+
+
+def _batches(rows: Iterable[Dict[str, Any]], size: int) -> Iterator[list]:
+    it = iter(rows)
+    while True:
+        batch = list(islice(it, size))
+        if not batch:
+            return
+        yield batch
+
+
+def iter_ndjson(rows: Iterable[Dict[str, Any]], batch_size: int = STREAM_BATCH_SIZE) -> Iterator[bytes]:
+    """One JSON document per line, serialized and flushed one batch at a time."""
+    for batch in _batches(rows, batch_size):
+        yield "".join(json.dumps(doc, allow_nan=False) + "\n" for doc in batch).encode("utf-8")
+
+
+def iter_json_array(rows: Iterable[Dict[str, Any]], batch_size: int = STREAM_BATCH_SIZE) -> Iterator[bytes]:
+    """A single JSON array written in chunks, so the client sees the same body as a JSONResponse."""
+    yield b"["
+    first = True
+    for batch in _batches(rows, batch_size):
+        body = ",".join(json.dumps(doc, allow_nan=False) for doc in batch)
+        yield (body if first else "," + body).encode("utf-8")
+        first = False
+    yield b"]"
+
+
+def stream_documents(rows: Iterable[Dict[str, Any]], fmt: str, batch_size: int = STREAM_BATCH_SIZE) -> StreamingResponse:
+    if fmt == "ndjson":
+        return StreamingResponse(iter_ndjson(rows, batch_size), media_type="application/x-ndjson")
+    return StreamingResponse(iter_json_array(rows, batch_size), media_type="application/json")
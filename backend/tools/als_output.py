@@ -0,0 +1,69 @@
+"""Columnar storage for ALS top-k recommendation lists.
+
+The (userId, movieId, predicted_rating) triples are stored as numbered
+.npz parts of typed columns:
+
+    part-00000.npz  userId int32, movieId int32, predicted_rating float32
+
+Each part holds at most `rows_per_part` rows, so writers and readers only
+hold one part in memory at a time. Movie metadata is not duplicated into
+every row. `iter_hybrid_frames` joins it one part at a time when the
+denormalised hybridRecommendation2-style documents are actually needed.
+"""
+from itertools import chain
+from pathlib import Path
+from typing import Dict, Iterator, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+
+COLUMNS = {"userId": np.int32, "movieId": np.int32, "predicted_rating": np.float32}
+ROWS_PER_PART = 1_000_000
+
+
+def flatten_recommendations(user_ids: Sequence, recommendations: Sequence[Sequence]) -> Dict[str, np.ndarray]:
+    """Explode per-user recommendation lists into typed columns.
+
+    `recommendations[i]` is user i's list of (movieId, rating) pairs, as
+    Spark's recommendForAllUsers returns them (Rows or plain tuples). Each
+    list is repeated/chained once at C speed; no per-row dicts are built.
+    """
+    lengths = np.fromiter(map(len, recommendations), dtype=np.int64, count=len(recommendations))
+    total = int(lengths.sum())
+    pairs = np.fromiter(chain.from_iterable(chain.from_iterable(recommendations)),
+                        dtype=np.float64, count=2 * total).reshape(total, 2)
+    return {
+        "userId": np.repeat(np.asarray(user_ids, dtype=np.int32), lengths),
+        "movieId": pairs[:, 0].astype(np.int32),
+        "predicted_rating": pairs[:, 1].astype(np.float32),
+    }
+
+
+def write_parts(out_dir: Path, columns: Dict[str, np.ndarray], rows_per_part: int = ROWS_PER_PART) -> int:
+    """Write `columns` as part-NNNNN.npz files, replacing any previous parts. Returns the part count."""
+    out_dir = Path(out_dir)
+    out_dir.mkdir(parents=True, exist_ok=True)
+    for stale in out_dir.glob("part-*.npz"):
+        stale.unlink()
+    n = len(next(iter(columns.values()))) if columns else 0
+    parts = 0
+    for start in range(0, n, rows_per_part):
+        np.savez(out_dir / f"part-{parts:05d}.npz",
+                 **{name: np.asarray(columns[name][start:start + rows_per_part], dtype=dtype)
+                    for name, dtype in COLUMNS.items()})
+        parts += 1
+    return parts
+
+
+def iter_parts(out_dir: Path) -> Iterator[Dict[str, np.ndarray]]:
+    for path in sorted(Path(out_dir).glob("part-*.npz")):
+        with np.load(path) as part:
+            yield {name: part[name] for name in COLUMNS}
+
+
+def iter_hybrid_frames(out_dir: Path, movies: pd.DataFrame) -> Iterator[Tuple[int, pd.DataFrame]]:
+    """(part number, frame) with movie metadata joined on movieId, one part at a time."""
+    movies = movies.drop_duplicates("movieId").set_index("movieId")
+    for number, part in enumerate(iter_parts(out_dir)):
+        frame = pd.DataFrame(part).join(movies, on="movieId", how="left")
+        yield number, frame
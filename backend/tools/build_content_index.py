@@ -0,0 +1,45 @@
+"""Build the content-based similar-movies index (hashed tf-idf over text metadata).
+
+Reads the live catalog (one row per movieId) and hashes overview words and
+director / actor / producer names into 2^18 features. The vectors are
+tf-idf weighted and L2-normalised; cosine similarity is then a dot product.
+Stored as feature-major posting arrays (.npy) that server.content_index
+memory-maps. A full rebuild also drops the delta segments that /sync-added-movies
+and /delete accumulate.
+
+Run from backend/:
+    python -m tools.build_content_index [--out models/content]
+"""
+import argparse
+import time
+from pathlib import Path
+
+from server.catalog import CatalogStore
+from server.content_index import CONTENT_INDEX_DIR, build_index, save_index
+from tools.db import movie_db
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", type=Path, default=CONTENT_INDEX_DIR)
+    args = parser.parse_args()
+
+    snapshot = CatalogStore(movie_db()).load()
+    movies, seen = [], set()
+    for movie in snapshot.movies:
+        movie_id = movie.get("movieId")
+        if movie_id not in (None, "") and str(movie_id) not in seen:
+            seen.add(str(movie_id))
+            movies.append(movie)
+
+    started = time.perf_counter()
+    arrays = build_index(movies)
+    print(f"🧮 Indexed {len(movies)} movies, {len(arrays['postings_docs'])} postings "
+          f"in {time.perf_counter() - started:.2f}s")
+
+    save_index(args.out, arrays)
+    print(f"💾 Content index written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,105 @@
+"""Build the item-item co-occurrence neighbour index from user interactions.
+
+Streams liked.likedMovies, saved.SaveMovies and history.historyMovies into
+a binary users x movies SciPy matrix (a movie counts once per user, whichever
+lists it is in). The co-occurrence counts are then C = X'X, normalised
+to cosine (C_ij / sqrt(n_i n_j)) or Jaccard (C_ij / (n_i + n_j - C_ij)).
+Each movie keeps its --top-n best neighbours.
+
+The result is written as one .npz of flat arrays, read by
+server.neighbors.NeighborIndex: item_ids, indptr (int32), neighbors
+(int32) and scores (float32).
+
+Run from backend/:
+    python -m tools.build_neighbors [--metric cosine|jaccard] [--top-n 50] [--min-support 2]
+"""
+import argparse
+import time
+from pathlib import Path
+
+import numpy as np
+from scipy import sparse
+
+from server.interactions import ID_ARRAYS, entry_id
+from server.neighbors import NEIGHBORS_PATH
+from tools.db import movie_db
+
+
+def interaction_matrix(db, max_items: int, batch_size: int = 1000):
+    """(binary users x movies CSR, movie ids) over all interaction collections."""
+    users, items = {}, {}
+    rows, cols = [], []
+    for name, field in ID_ARRAYS.items():
+        cursor = db[name].find({}, {"userId": 1, field: 1}).batch_size(batch_size)
+        for doc in cursor:
+            ids = [m for m in map(entry_id, doc.get(field) or []) if m]
+            if not ids:
+                continue
+            # lists are appended to, so the tail is the user's most recent activity
+            ids = ids[-max_items:]
+            u = users.setdefault(str(doc.get("userId")), len(users))
+            rows.extend([u] * len(ids))
+            cols.extend(items.setdefault(m, len(items)) for m in ids)
+
+    matrix = sparse.csr_matrix(
+        (np.ones(len(rows), dtype=np.float32), (np.asarray(rows, dtype=np.int32), np.asarray(cols, dtype=np.int32))),
+        shape=(len(users), len(items)),
+    )
+    matrix.data[:] = 1.0  # duplicates were summed; a movie counts once per user
+    return matrix, np.array(list(items), dtype=str)
+
+
+def normalized_cooccurrence(matrix: sparse.csr_matrix, metric: str, min_support: int) -> sparse.csr_matrix:
+    counts = np.asarray(matrix.sum(axis=0)).ravel()
+    co = (matrix.T @ matrix).tocoo()
+    keep = (co.row != co.col) & (co.data >= min_support)
+    i, j, c = co.row[keep], co.col[keep], co.data[keep]
+    if metric == "cosine":
+        scores = c / np.sqrt(counts[i] * counts[j])
+    else:
+        scores = c / (counts[i] + counts[j] - c)
+    return sparse.csr_matrix((scores.astype(np.float32), (i, j)), shape=co.shape)
+
+
+def top_n(similarity: sparse.csr_matrix, n: int):
+    """Per row, the n highest-scoring columns, best first -> (indptr, neighbors, scores)."""
+    similarity = similarity.tocsr()
+    similarity.sort_indices()
+    lengths = np.diff(similarity.indptr)
+    row = np.repeat(np.arange(similarity.shape[0]), lengths)
+    order = np.lexsort((-similarity.data, row))  # by row, then score descending
+    rank = np.arange(len(order)) - similarity.indptr[row[order]]
+    keep = order[rank < n]
+    kept = np.minimum(lengths, n)
+    indptr = np.concatenate([[0], np.cumsum(kept)]).astype(np.int32)
+    return indptr, similarity.indices[keep].astype(np.int32), similarity.data[keep].astype(np.float32)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--out", type=Path, default=NEIGHBORS_PATH)
+    parser.add_argument("--metric", choices=("cosine", "jaccard"), default="cosine")
+    parser.add_argument("--top-n", type=int, default=50)
+    parser.add_argument("--min-support", type=int, default=2, help="minimum users two movies must share")
+    parser.add_argument("--max-items-per-user", type=int, default=500,
+                        help="most recent movies used per list; bounds the per-user pair count")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    matrix, item_ids = interaction_matrix(movie_db(), args.max_items_per_user)
+    print(f"📥 {matrix.nnz} interactions: {matrix.shape[0]} users x {matrix.shape[1]} movies "
+          f"in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    similarity = normalized_cooccurrence(matrix, args.metric, args.min_support)
+    indptr, neighbors, scores = top_n(similarity, args.top_n)
+    print(f"🧮 {similarity.nnz} co-occurring pairs, kept {len(neighbors)} ({args.metric}) "
+          f"in {time.perf_counter() - started:.2f}s")
+
+    args.out.parent.mkdir(parents=True, exist_ok=True)
+    np.savez(args.out, item_ids=item_ids, indptr=indptr, neighbors=neighbors, scores=scores)
+    print(f"💾 Neighbour index written to {args.out}")
+
+
+if __name__ == "__main__":
+    main()
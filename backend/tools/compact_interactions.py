@@ -0,0 +1,85 @@
+"""One-shot migration: shrink liked / saved / history arrays to {movieId, ts} entries.
+
+/like, /watchLater and /history used to embed a full movie document
+(overview, actors, producers, ...) per entry. The endpoints now store
+compact {movieId, ts} entries and join the movie from the catalog on
+read, so the embedded copies are only dead weight. This rewrites every
+array to compact entries, in order, one per movieId. Bare ids become
+entries too. A legacy entry keeps its `ts` if it had one; otherwise the
+entry has no `ts`. history.historyMovies (the id list) is left as it is.
+
+Movies the catalog no longer has keep the title and poster_url of their
+embedded copy (interactions.FALLBACK_FIELDS), since that copy is the only
+data left for them.
+
+Run from backend/:
+    python -m tools.compact_interactions [--dry-run] [--batch-size 500]
+"""
+import argparse
+import time
+
+import bson
+from pymongo import UpdateOne
+
+from server.catalog import catalog_collection
+from server.interactions import ENTRY_ARRAYS, FALLBACK_FIELDS, bulk_flush, entry_id
+from tools.db import movie_db
+
+
+def catalog_ids(db, batch_size) -> set:
+    cursor = db[catalog_collection(db)].find({}, {"_id": 0, "movieId": 1}).batch_size(batch_size * 10)
+    return {str(doc["movieId"]) for doc in cursor if doc.get("movieId") is not None}
+
+
+def compact(items, known: set) -> list:
+    out, seen = [], set()
+    for item in items:
+        mid = entry_id(item)
+        if not mid or mid in seen:
+            continue
+        seen.add(mid)
+        entry = {"movieId": mid}
+        if isinstance(item, dict):
+            if item.get("ts") is not None:
+                entry["ts"] = item["ts"]
+            if mid not in known:
+                entry.update((f, item[f]) for f in FALLBACK_FIELDS if item.get(f))
+        out.append(entry)
+    return out
+
+
+def compact_collection(db, name, field, known, batch_size, dry_run):
+    collection = db[name]
+    ops, scanned, changed, before, after = [], 0, 0, 0, 0
+    for doc in collection.find({field: {"$type": "array"}}, {field: 1}).batch_size(batch_size):
+        scanned += 1
+        items = doc.get(field) or []
+        entries = compact(items, known)
+        if entries != items:
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {field: entries}}))
+            before += len(bson.encode({field: items}))
+            after += len(bson.encode({field: entries}))
+        if len(ops) >= batch_size:
+            changed += bulk_flush(collection, ops, dry_run)
+    changed += bulk_flush(collection, ops, dry_run)
+    print(f"👤 {name}.{field}: scanned {scanned}, rewrote {changed} "
+          f"({before / 2**20:.1f} MB -> {after / 2**20:.1f} MB)")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--dry-run", action="store_true", help="report sizes without writing")
+    args = parser.parse_args()
+
+    db = movie_db()
+    started = time.perf_counter()
+    known = catalog_ids(db, args.batch_size)
+    print(f"📦 {len(known)} movieIds in the catalog")
+    for name, field in ENTRY_ARRAYS.items():
+        compact_collection(db, name, field, known, args.batch_size, args.dry_run)
+    print(f"✅ Interaction compaction finished in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,23 @@
+import os
+from pathlib import Path
+
+from dotenv import load_dotenv
+from pymongo import MongoClient
+
+# Offline tools share the backend's server/.env
+load_dotenv(dotenv_path=Path(__file__).resolve().parent.parent / "server" / ".env")
+
+
+def _client(env_key: str, offline_key: str) -> MongoClient:
+    uri = (os.getenv(env_key) or os.getenv(offline_key) or "").strip()
+    if not uri.startswith("mongodb"):
+        raise ValueError(f"❌ Invalid {env_key} format")
+    return MongoClient(uri)
+
+
+def movie_db():
+    return _client("MOVIE_DB_URI", "OFFLINE_MOVIE_DB_URI")["NewMovieDatabase"]
+
+
+def user_db():
+    return _client("MONGO_URI", "OFFLINE_MONGO_URI")["users"]
@@ -0,0 +1,89 @@
+"""One-shot migration: rewrite every `genres` field to the canonical array.
+
+Streams the catalog collections and the per-user interaction collections,
+rewrites `genres` with server.genres.normalize_genres (lowercase, trimmed,
+de-duplicated list) using unordered bulk writes, then creates the multikey
+index on the catalog.
+
+Run from backend/:
+    python -m tools.migrate_genres [--dry-run] [--batch-size 1000]
+"""
+import argparse
+import time
+
+from pymongo import ASCENDING, UpdateOne
+
+from server.catalog import bump_catalog_revision, catalog_collection
+from server.genres import normalize_genres, rebuild_genre_facet
+from server.interactions import ENTRY_ARRAYS, bulk_flush
+from tools.db import movie_db
+
+# collection -> array field holding embedded movie objects
+INTERACTION_ARRAYS = {**ENTRY_ARRAYS, "recommended": "recommended"}
+
+
+def migrate_catalog(db, name, batch_size, dry_run):
+    collection = db[name]
+    ops, scanned, changed = [], 0, 0
+    for doc in collection.find({}, {"genres": 1}).batch_size(batch_size):
+        scanned += 1
+        genres = normalize_genres(doc.get("genres"))
+        if doc.get("genres") != genres:
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {"genres": genres}}))
+        if len(ops) >= batch_size:
+            changed += bulk_flush(collection, ops, dry_run)
+    changed += bulk_flush(collection, ops, dry_run)
+    print(f"🎬 {name}: scanned {scanned}, rewrote {changed}")
+
+
+def migrate_interactions(db, name, field, batch_size, dry_run):
+    collection = db[name]
+    ops, scanned, changed = [], 0, 0
+    for doc in collection.find({field: {"$type": "array"}}, {field: 1}).batch_size(batch_size):
+        scanned += 1
+        items = doc.get(field) or []
+        rewritten = []
+        dirty = False
+        for item in items:
+            if isinstance(item, dict) and "genres" in item:
+                genres = normalize_genres(item.get("genres"))
+                if item.get("genres") != genres:
+                    item = {**item, "genres": genres}
+                    dirty = True
+            rewritten.append(item)
+        if dirty:
+            ops.append(UpdateOne({"_id": doc["_id"]}, {"$set": {field: rewritten}}))
+        if len(ops) >= batch_size:
+            changed += bulk_flush(collection, ops, dry_run)
+    changed += bulk_flush(collection, ops, dry_run)
+    print(f"👤 {name}.{field}: scanned {scanned}, rewrote {changed}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=1000)
+    parser.add_argument("--dry-run", action="store_true", help="count changes without writing")
+    args = parser.parse_args()
+
+    db = movie_db()
+    started = time.perf_counter()
+    catalog = catalog_collection(db)
+
+    for name in (catalog, "added"):
+        migrate_catalog(db, name, args.batch_size, args.dry_run)
+    for name, field in INTERACTION_ARRAYS.items():
+        migrate_interactions(db, name, field, args.batch_size, args.dry_run)
+
+    if not args.dry_run:
+        db[catalog].create_index([("genres", ASCENDING)], name="genres_multikey")
+        print("📇 Multikey index on genres ensured")
+        rebuild_genre_facet(db, catalog)
+        print("🏷️ Genre facet rebuilt")
+        # Running servers pick the rewritten catalog up on their next reload
+        bump_catalog_revision(db)
+
+    print(f"✅ Genre migration finished in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
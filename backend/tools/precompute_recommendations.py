@@ -0,0 +1,189 @@
+"""Batch precompute of per-user recommendation lists.
+
+Streams every user from users.streamer in _id order, computes their list
+in a pool of worker processes with the same hybrid blend /regenerate serves
+(server.hybrid_scorer), one vectorized scoring call per batch, and upserts
+the results into NewMovieDatabase.recommended with unordered bulk writes.
+
+The catalog snapshot, ALS model and content index are loaded once in the
+parent; on Linux the workers are forked and share them copy-on-write.
+Workers only exchange user profiles (ids, genres, interacted movieIds) and
+row positions with the parent, and all Mongo I/O stays in the parent
+process: each batch's interactions are read with one $in query per
+interaction collection.
+
+Progress and throughput are printed per batch. After each batch is written
+the last user _id is saved to the checkpoint file, and --resume continues
+from there.
+
+Running servers are not notified. They keep serving a user's cached
+/recommendations list (server.result_cache) until RESULT_CACHE_TTL runs
+out, so a freshly written list can take that long to show up.
+
+Run from backend/:
+    python -m tools.precompute_recommendations [--workers 4] [--batch-size 500] [--resume]
+"""
+import argparse
+import json
+import multiprocessing as mp
+import os
+import random
+import time
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from bson import ObjectId
+from pymongo import UpdateOne
+
+from server.als_engine import AlsEngine
+from server.catalog import CatalogStore
+from server.content_index import ContentIndex
+from server.hybrid_scorer import HybridScorer, UserProfile
+from server.interactions import ID_ARRAYS, entry_id
+from server.recommender import REGENERATE_SIZE, REGENERATE_SPREAD, genre_pool, materialize
+from tools.db import movie_db, user_db
+
+_scorer: Optional[HybridScorer] = None
+_seed = 0
+
+
+def _load_scorer() -> HybridScorer:
+    return HybridScorer(CatalogStore(movie_db()).load(), AlsEngine.load_if_present(), ContentIndex.load_if_present())
+
+
+def _init_worker(seed: int) -> None:
+    global _scorer, _seed
+    _seed = seed
+    if _scorer is None:
+        # spawn-based platforms: no inherited memory, load our own copy
+        _scorer = _load_scorer()
+
+
+def _compute_batch(profiles: List[UserProfile], k: int) -> List[Tuple[str, List[int]]]:
+    # like /regenerate, choose from the user's genre pool (built here, not shipped from the parent)
+    profiles = [p._replace(allowed=genre_pool(_scorer.snapshot, p.genres)) if p.genres else p for p in profiles]
+    rngs = [random.Random(f"{_seed}:{p.user_id}") for p in profiles]
+    ranked = _scorer.recommend(profiles, k, spread=REGENERATE_SPREAD, rngs=rngs)
+    return [(p.user_id, positions) for p, positions in zip(profiles, ranked)]
+
+
+def _with_interactions(movies, users: List[Tuple[str, List[str]]]) -> List[UserProfile]:
+    user_ids = [user_id for user_id, _ in users]
+    interacted: Dict[str, List[str]] = {user_id: [] for user_id in user_ids}
+    for name, field in ID_ARRAYS.items():
+        for doc in movies[name].find({"userId": {"$in": user_ids}}, {"userId": 1, field: 1}):
+            ids = interacted.get(doc.get("userId"))
+            if ids is not None:
+                ids.extend(entry_id(m) for m in doc.get(field) or [])
+    return [UserProfile(user_id, genres, interacted[user_id]) for user_id, genres in users]
+
+
+def _read_checkpoint(path: Path) -> Dict:
+    if path.exists():
+        return json.loads(path.read_text())
+    return {}
+
+
+def _write_checkpoint(path: Path, last_id: ObjectId, processed: int) -> None:
+    tmp = path.with_suffix(".tmp")
+    tmp.write_text(json.dumps({
+        "last_id": str(last_id),
+        "processed": processed,
+        "updatedAt": datetime.utcnow().isoformat(),
+    }))
+    os.replace(tmp, path)
+
+
+def _user_batches(users_db, after: Optional[ObjectId], batch_size: int):
+    query = {"_id": {"$gt": after}} if after else {}
+    cursor = users_db.streamer.find(query, {"userId": 1, "genres": 1}).sort("_id", 1).batch_size(batch_size)
+    batch, last_id = [], None
+    for doc in cursor:
+        if not doc.get("userId"):
+            continue
+        batch.append((doc["userId"], doc.get("genres") or []))
+        last_id = doc["_id"]
+        if len(batch) >= batch_size:
+            yield batch, last_id
+            batch = []
+    if batch:
+        yield batch, last_id
+
+
+def main():
+    global _scorer, _seed
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--batch-size", type=int, default=500, help="users per worker task / bulk write")
+    parser.add_argument("--k", type=int, default=REGENERATE_SIZE, help="recommendations per user")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--checkpoint", type=Path, default=Path("precompute_checkpoint.json"))
+    parser.add_argument("--resume", action="store_true", help="continue after the checkpointed user")
+    args = parser.parse_args()
+
+    movies, users = movie_db(), user_db()
+    _scorer = _load_scorer()
+    _seed = args.seed
+
+    checkpoint = _read_checkpoint(args.checkpoint) if args.resume else {}
+    after = ObjectId(checkpoint["last_id"]) if checkpoint.get("last_id") else None
+    processed = checkpoint.get("processed", 0)
+    total = users.streamer.estimated_document_count()
+    if after:
+        print(f"↩️ Resuming after user _id {after} ({processed} already done)")
+
+    ctx = mp.get_context("fork") if "fork" in mp.get_all_start_methods() else None
+    started = time.perf_counter()
+    done_this_run, written = 0, 0
+
+    with ProcessPoolExecutor(max_workers=args.workers, mp_context=ctx,
+                             initializer=_init_worker, initargs=(args.seed,)) as pool:
+        in_flight = deque()
+        batches = _user_batches(users, after, args.batch_size)
+
+        def submit_next() -> bool:
+            nxt = next(batches, None)
+            if nxt is None:
+                return False
+            batch, last_id = nxt
+            profiles = _with_interactions(movies, batch)
+            in_flight.append((pool.submit(_compute_batch, profiles, args.k), last_id))
+            return True
+
+        for _ in range(args.workers * 2):
+            if not submit_next():
+                break
+
+        # Results are consumed in submission order so the checkpoint only ever
+        # moves past users whose lists are already written.
+        while in_flight:
+            future, last_id = in_flight.popleft()
+            results = future.result()
+            submit_next()
+
+            ops = [
+                UpdateOne({"userId": user_id}, {"$set": {"recommended": materialize(_scorer.snapshot, positions)}}, upsert=True)
+                for user_id, positions in results
+            ]
+            if ops:
+                res = movies.recommended.bulk_write(ops, ordered=False)
+                written += res.upserted_count + res.modified_count
+
+            done_this_run += len(results)
+            processed += len(results)
+            _write_checkpoint(args.checkpoint, last_id, processed)
+
+            elapsed = time.perf_counter() - started
+            rate = done_this_run / elapsed if elapsed else 0.0
+            print(f"⏳ {processed}/{total} users | {rate:.0f} users/s | last _id {last_id}")
+
+    elapsed = time.perf_counter() - started
+    print(f"✅ Precomputed {done_this_run} users in {elapsed:.1f}s "
+          f"({done_this_run / elapsed if elapsed else 0:.0f} users/s), {written} documents written")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,133 @@
+"""One-shot migration: collapse hybridRecommendation2 into a `movies` catalog.
+
+hybridRecommendation2 holds one full metadata copy per (user, movie)
+prediction. This writes one `movies` document per movieId: the metadata of
+that movie's highest-rated row (keeping its _id), with predicted_rating set
+to the best score the movie has for any user (the value the per-title dedupe
+used to pick anyway) and prediction_count set to how many rows it had. The
+hybrid scorer's popularity signal reads prediction_count.
+
+The per-row predictions themselves are not kept. Their userIds are the
+training set's users, not app users, so no endpoint reads them by user;
+recommendations come from the ALS model and the stored lists instead.
+A `predictions` collection left by earlier runs of this tool is unused
+and can be dropped.
+
+The text and genres indexes are recreated on `movies`, the genre facet is
+rebuilt, and only then is sync_metadata switched to the split layout.
+Running servers pick the new layout up on their next catalog reload.
+hybridRecommendation2 is left untouched; unsetting `catalog_layout`
+switches back to it.
+
+Run from backend/:
+    python -m tools.split_catalog [--dry-run] [--batch-size 5000] [--force]
+"""
+import argparse
+import math
+import time
+
+from collections import Counter
+
+from pymongo import ASCENDING
+
+from server.catalog import (
+    CATALOG_COLLECTION, MOVIES_COLLECTION, SPLIT_LAYOUT, SYNC_INFO_ID,
+    bump_catalog_revision, catalog_collection,
+)
+from server.genres import rebuild_genre_facet
+from tools.db import movie_db
+
+# Per-prediction fields that do not belong on the movie
+PREDICTION_FIELDS = ("userId", "predicted_rating")
+
+
+def _score(value) -> float:
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+
+def split(db, batch_size: int, dry_run: bool):
+    source = db[CATALOG_COLLECTION]
+
+    # movieId -> (best score, that row's metadata); the catalog fits in memory
+    best, counts = {}, Counter()
+    rows, skipped = 0, 0
+    cursor = source.find({}).sort("_id", ASCENDING).batch_size(batch_size)
+    for doc in cursor:
+        movie_id = doc.get("movieId")
+        if movie_id in (None, ""):
+            skipped += 1
+            continue
+        movie_id = str(movie_id)
+        score = _score(doc.get("predicted_rating"))
+        rows += 1
+        counts[movie_id] += 1
+
+        kept = best.get(movie_id)
+        if kept is None or (not math.isnan(score) and (math.isnan(kept[0]) or score > kept[0])):
+            best[movie_id] = (score, doc)
+    print(f"📈 {rows} prediction rows read, {skipped} rows without movieId skipped")
+
+    movies = []
+    for movie_id, (score, doc) in best.items():
+        movie = {k: v for k, v in doc.items() if k not in PREDICTION_FIELDS}
+        movie["movieId"] = movie_id
+        movie["predicted_rating"] = None if math.isnan(score) else score
+        movie["prediction_count"] = counts[movie_id]
+        movies.append(movie)
+    if not dry_run:
+        db[MOVIES_COLLECTION].drop()
+        for start in range(0, len(movies), batch_size):
+            db[MOVIES_COLLECTION].insert_many(movies[start:start + batch_size], ordered=False)
+    print(f"🎬 {len(movies)} movies written")
+
+
+def create_movie_indexes(db):
+    source, movies = db[CATALOG_COLLECTION], db[MOVIES_COLLECTION]
+    movies.create_index([("movieId", ASCENDING)], name="movieId_unique", unique=True)
+    movies.create_index([("title", ASCENDING)], name="title")
+    movies.create_index([("genres", ASCENDING)], name="genres_multikey")
+    # same text index /search uses on the old collection
+    for name, spec in source.index_information().items():
+        if "weights" in spec:
+            movies.create_index(
+                [(field, "text") for field in spec["weights"]],
+                name=name,
+                weights=spec["weights"],
+                default_language=spec.get("default_language", "english"),
+            )
+    print("📇 Indexes created on movies")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=5000)
+    parser.add_argument("--dry-run", action="store_true", help="count documents without writing")
+    parser.add_argument("--force", action="store_true",
+                        help="rebuild even if the split layout is already live (drops movies added since)")
+    args = parser.parse_args()
+
+    db = movie_db()
+    if catalog_collection(db) == MOVIES_COLLECTION and not args.force:
+        print("⚠️ The catalog already uses the split layout; pass --force to rebuild it.")
+        return
+
+    started = time.perf_counter()
+    split(db, args.batch_size, args.dry_run)
+    if not args.dry_run:
+        create_movie_indexes(db)
+        rebuild_genre_facet(db, MOVIES_COLLECTION)
+        print("🏷️ Genre facet rebuilt")
+        db["sync_metadata"].update_one(
+            {"_id": SYNC_INFO_ID}, {"$set": {"catalog_layout": SPLIT_LAYOUT}}, upsert=True,
+        )
+        bump_catalog_revision(db)
+        print("🔀 Catalog layout switched to movies")
+
+    print(f"✅ Catalog split finished in {time.perf_counter() - started:.1f}s")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,237 @@
+"""Train the ALS collaborative-filtering model locally, without Spark.
+
+Local replacement for the ALS step of fyp_enriched_data_ml_training.py.
+Reads a MovieLens-style ratings.csv (userId, movieId, rating) into a SciPy
+CSR matrix and alternates least-squares solves for the user and item
+factors:
+
+  explicit  ALS-WR on the ratings. λ is scaled by each row's rating count,
+            the same regularisation Spark's ALS applies for regParam.
+  implicit  Hu/Koren/Volinsky confidence-weighted ALS, with
+            confidence 1 + alpha * rating.
+
+Each half-step solves every row's f x f system in vectorised chunks: the
+per-row Gram matrices are built from the CSR slices with einsum and
+solved in batches with np.linalg.solve. Chunks run on a thread pool, and
+NumPy releases the GIL inside both calls.
+
+Outputs, in --out (default: server.als_engine.ALS_MODEL_DIR):
+  user_factors.npy, item_factors.npy, user_ids.npy, item_ids.npy
+      the files server.als_engine.AlsEngine memory-maps
+  als_topk/part-*.npz
+      userId, movieId (int32), predicted_rating (float32): the top --top-k
+      items per user, the table the notebook flattened out of
+      recommendForAllUsers (see tools.als_output)
+  hybrid_recommendations.csv
+      only with --movies: the legacy export, als_topk joined with the
+      movie metadata part by part
+
+Run from backend/:
+    python -m tools.train_als ratings.csv [--implicit] [--rank 10] [--iterations 10]
+        [--reg 0.1] [--alpha 40] [--threads 8] [--top-k 5] [--movies movies_tmdbMetadata.csv]
+"""
+import argparse
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+
+from server.als_engine import ALS_MODEL_DIR
+from tools.als_output import iter_hybrid_frames, write_parts
+
+# Floats allowed for one chunk's per-entry outer products (nnz x rank x rank);
+# about 64 MB per worker thread.
+CHUNK_FLOATS = 8_000_000
+
+
+def load_ratings(path) -> Tuple[sparse.csr_matrix, np.ndarray, np.ndarray]:
+    """ratings.csv -> (users x items CSR of ratings, user ids, item ids)."""
+    df = pd.read_csv(
+        path,
+        usecols=["userId", "movieId", "rating"],
+        dtype={"userId": np.int64, "movieId": np.int64, "rating": np.float32},
+    )
+    return ratings_matrix(df)
+
+
+def ratings_matrix(df: pd.DataFrame) -> Tuple[sparse.csr_matrix, np.ndarray, np.ndarray]:
+    """userId / movieId / rating frame -> (users x items CSR of ratings, user ids, item ids)."""
+    user_ids, user_idx = np.unique(df["userId"].to_numpy(), return_inverse=True)
+    item_ids, item_idx = np.unique(df["movieId"].to_numpy(), return_inverse=True)
+    matrix = sparse.csr_matrix(
+        (df["rating"].to_numpy(), (user_idx, item_idx)),
+        shape=(len(user_ids), len(item_ids)),
+        dtype=np.float32,
+    )
+    matrix.sum_duplicates()
+    return matrix, user_ids, item_ids
+
+
+def _row_chunks(indptr: np.ndarray, chunk_nnz: int):
+    """Split rows into contiguous [start, stop) ranges of about chunk_nnz entries each (at least one row)."""
+    n_rows = len(indptr) - 1
+    start = 0
+    while start < n_rows:
+        stop = int(np.searchsorted(indptr, indptr[start] + chunk_nnz, side="right")) - 1
+        stop = min(max(stop, start + 1), n_rows)
+        yield start, stop
+        start = stop
+
+
+def _solve_rows(matrix: sparse.csr_matrix, fixed: np.ndarray, out: np.ndarray, start: int, stop: int,
+                reg: float, implicit: bool, alpha: float, gram: Optional[np.ndarray]) -> None:
+    lo, hi = matrix.indptr[start], matrix.indptr[stop]
+    cols = matrix.indices[lo:hi]
+    values = matrix.data[lo:hi].astype(np.float64)
+    counts = np.diff(matrix.indptr[start:stop + 1])
+    rank = fixed.shape[1]
+
+    Y = fixed[cols]                                      # nnz x f
+    if implicit:
+        confidence = 1.0 + alpha * values
+        weights, targets = confidence - 1.0, confidence  # (c - 1) y y^T,  c * p * y  (p = 1)
+    else:
+        weights, targets = np.ones_like(values), values
+
+    # Per-row sums over each row's contiguous slice of entries; rows without
+    # ratings are skipped because reduceat cannot express an empty segment.
+    A = np.zeros((stop - start, rank, rank))
+    b = np.zeros((stop - start, rank))
+    rated = counts > 0
+    if len(cols):
+        offsets = (matrix.indptr[start:stop] - lo)[rated]
+        A[rated] = np.add.reduceat(np.einsum("n,ni,nj->nij", weights, Y, Y), offsets, axis=0)
+        b[rated] = np.add.reduceat(targets[:, None] * Y, offsets, axis=0)
+
+    eye = np.eye(rank)
+    if implicit:
+        A += gram + reg * eye
+    else:
+        A += (reg * np.maximum(counts, 1))[:, None, None] * eye
+    out[start:stop] = np.linalg.solve(A, b[..., None])[..., 0]
+
+
+def als_half_step(matrix: sparse.csr_matrix, fixed: np.ndarray, reg: float, implicit: bool,
+                  alpha: float, pool: ThreadPoolExecutor) -> np.ndarray:
+    """Solve every row's factors in `matrix` with the other side's factors held fixed."""
+    chunk_nnz = max(1, CHUNK_FLOATS // (fixed.shape[1] ** 2))
+    out = np.empty((matrix.shape[0], fixed.shape[1]))
+    gram = fixed.T @ fixed if implicit else None
+    futures = [
+        pool.submit(_solve_rows, matrix, fixed, out, start, stop, reg, implicit, alpha, gram)
+        for start, stop in _row_chunks(matrix.indptr, chunk_nnz)
+    ]
+    for future in futures:
+        future.result()
+    return out
+
+
+def train(matrix: sparse.csr_matrix, rank: int = 10, iterations: int = 10, reg: float = 0.1,
+          implicit: bool = False, alpha: float = 40.0, threads: int = 1, seed: int = 0,
+          verbose: bool = True) -> Tuple[np.ndarray, np.ndarray]:
+    """Alternating least squares on a users x items CSR matrix -> (user factors, item factors)."""
+    rng = np.random.default_rng(seed)
+    users = rng.normal(scale=0.1, size=(matrix.shape[0], rank))
+    items = rng.normal(scale=0.1, size=(matrix.shape[1], rank))
+    by_item = matrix.T.tocsr()
+
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        for it in range(1, iterations + 1):
+            started = time.perf_counter()
+            users = als_half_step(matrix, items, reg, implicit, alpha, pool)
+            items = als_half_step(by_item, users, reg, implicit, alpha, pool)
+            if verbose:
+                line = f"🔁 iteration {it}/{iterations} in {time.perf_counter() - started:.2f}s"
+                if not implicit:
+                    line += f", train RMSE {train_rmse(matrix, users, items):.4f}"
+                print(line)
+    return users.astype(np.float32), items.astype(np.float32)
+
+
+def train_rmse(matrix: sparse.csr_matrix, users: np.ndarray, items: np.ndarray) -> float:
+    coo = matrix.tocoo()
+    predicted = np.einsum("ij,ij->i", users[coo.row], items[coo.col])
+    return float(np.sqrt(np.mean((predicted - coo.data) ** 2)))
+
+
+def top_k(users: np.ndarray, items: np.ndarray, k: int, exclude: Optional[sparse.csr_matrix] = None,
+          chunk: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+    """(item indices, scores) of each user's k best items, best first; `exclude` masks rated items."""
+    k = min(k, items.shape[0])
+    n = users.shape[0]
+    best = np.empty((n, k), dtype=np.int64)
+    scores = np.empty((n, k), dtype=np.float32)
+    for start in range(0, n, chunk):
+        stop = min(start + chunk, n)
+        block = users[start:stop] @ items.T
+        if exclude is not None:
+            rated = exclude[start:stop].tocoo()
+            block[rated.row, rated.col] = -np.inf
+        part = np.argpartition(-block, k - 1, axis=1)[:, :k]
+        part_scores = np.take_along_axis(block, part, axis=1)
+        order = np.argsort(-part_scores, axis=1, kind="stable")
+        best[start:stop] = np.take_along_axis(part, order, axis=1)
+        scores[start:stop] = np.take_along_axis(part_scores, order, axis=1)
+    return best, scores
+
+
+def save_model(out: Path, users: np.ndarray, items: np.ndarray, user_ids: np.ndarray, item_ids: np.ndarray) -> None:
+    out.mkdir(parents=True, exist_ok=True)
+    np.save(out / "user_factors.npy", users)
+    np.save(out / "item_factors.npy", items)
+    np.save(out / "user_ids.npy", user_ids)
+    np.save(out / "item_ids.npy", item_ids)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("ratings", type=Path, help="ratings.csv with userId, movieId, rating")
+    parser.add_argument("--out", type=Path, default=ALS_MODEL_DIR)
+    parser.add_argument("--implicit", action="store_true", help="treat ratings as implicit feedback")
+    parser.add_argument("--rank", type=int, default=10)
+    parser.add_argument("--iterations", type=int, default=10)
+    parser.add_argument("--reg", type=float, default=0.1)
+    parser.add_argument("--alpha", type=float, default=40.0, help="implicit confidence scale")
+    parser.add_argument("--threads", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--top-k", type=int, default=5)
+    parser.add_argument("--exclude-rated", action="store_true", help="leave already-rated movies out of the top-k")
+    parser.add_argument("--movies", type=Path, help="also export hybrid_recommendations.csv joined with this metadata csv")
+    args = parser.parse_args()
+
+    started = time.perf_counter()
+    matrix, user_ids, item_ids = load_ratings(args.ratings)
+    print(f"📥 Loaded {matrix.nnz} ratings: {len(user_ids)} users x {len(item_ids)} movies "
+          f"in {time.perf_counter() - started:.2f}s")
+
+    started = time.perf_counter()
+    users, items = train(matrix, args.rank, args.iterations, args.reg, args.implicit,
+                         args.alpha, args.threads, args.seed)
+    print(f"✅ Trained {'implicit' if args.implicit else 'explicit'} ALS rank {args.rank} "
+          f"in {time.perf_counter() - started:.2f}s")
+
+    save_model(args.out, users, items, user_ids, item_ids)
+
+    best, scores = top_k(users, items, args.top_k, matrix if args.exclude_rated else None)
+    parts = write_parts(args.out / "als_topk", {
+        "userId": np.repeat(user_ids, best.shape[1]),
+        "movieId": item_ids[best.ravel()],
+        "predicted_rating": scores.ravel(),
+    })
+    print(f"💾 Factors and top-{args.top_k} lists ({parts} parts) written to {args.out}")
+
+    if args.movies:
+        hybrid_path = args.out / "hybrid_recommendations.csv"
+        for number, frame in iter_hybrid_frames(args.out / "als_topk", pd.read_csv(args.movies)):
+            frame.to_csv(hybrid_path, mode="w" if number == 0 else "a",
+                         header=number == 0, index=False)
+        print(f"💾 Hybrid recommendations written to {hybrid_path}")
+
+
+if __name__ == "__main__":
+    main()
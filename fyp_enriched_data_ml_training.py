@@ -52,36 +52,43 @@ model = als.fit(ratings_df)
 user_recs = model.recommendForAllUsers(5)
 user_recs.show(5, truncate=False)
 
-"""convert als to pandas"""
-
-user_recs_pd = user_recs.toPandas()
-
-import pandas as pd
-
-# Flatten ALS output
-flattened_recs = []
+"""flatten als output with spark (explode), keep it typed and columnar"""
+
+from pyspark.sql.functions import col, explode
+
+# One (userId, movieId, predicted_rating) row per recommendation, built by
+# Spark's explode instead of iterrows() over a pandas copy of user_recs.
+als_flat = (
+    user_recs
+    .select(col("userId"), explode("recommendations").alias("rec"))
+    .select(
+        col("userId").cast("int"),
+        col("rec.movieId").cast("int").alias("movieId"),
+        col("rec.rating").cast("float").alias("predicted_rating"),
+    )
+)
+als_flat.show(5)
 
-for _, row in user_recs_pd.iterrows():
-    user_id = row['userId']
-    for rec in row['recommendations']:
-        flattened_recs.append({
-            'userId': user_id,
-            'movieId': rec['movieId'],
-            'predicted_rating': rec['rating']
-        })
+# Chunked, typed parquet parts; the movie metadata stays in its own file
+# instead of being copied onto every (user, movie) row.
+als_flat.write.mode("overwrite").parquet("/content/drive/MyDrive/MovieLens/als_recommendations.parquet")
+print("ALS recommendations saved to Drive.")
 
-als_flat_df = pd.DataFrame(flattened_recs)
-als_flat_df.head()
+"""merge als + movie metada (only if a denormalised CSV is still needed)"""
 
-movies_path = "/content/drive/MyDrive/MovieLens/movies_tmdbMetadata.csv"
-movies_df = pd.read_csv(movies_path)
+# uploadDatabase.py still reads the single hybrid_recommendations.csv; set
+# this to True when its input needs to be refreshed.
+EXPORT_HYBRID_CSV = False
 
-print(movies_df.columns)
+if EXPORT_HYBRID_CSV:
+    movies_path = "/content/drive/MyDrive/MovieLens/movies_tmdbMetadata.csv"
+    movies_df = spark.read.csv(movies_path, header=True, inferSchema=True)
 
-"""merge als + movie metada"""
+    print(movies_df.columns)
 
-hybrid_df = als_flat_df.merge(movies_df, on="movieId", how="left")
-hybrid_df.head()
+    hybrid_df = als_flat.join(movies_df, on="movieId", how="left")
+    hybrid_df.show(5)
 
-hybrid_df.to_csv("/content/drive/MyDrive/MovieLens/hybrid_recommendations.csv", index=False)
-print("Hybrid recommendations saved to Drive.")
\ No newline at end of file
+    # one file under the name the uploader expects, not a Spark part directory
+    hybrid_df.toPandas().to_csv("/content/drive/MyDrive/MovieLens/hybrid_recommendations.csv", index=False)
+    print("Hybrid recommendations saved to Drive.")